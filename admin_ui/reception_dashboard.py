@@ -283,7 +283,7 @@ async def update_request(
             )
 
         # Import here to avoid circular imports
-        from api_server import wa_send_text
+        from api_server import wa_send_text_async
 
         to_user = (row.get("user_id") or "").strip()
 
@@ -293,7 +293,7 @@ async def update_request(
                 detail="Missing user_id for WhatsApp reply",
             )
 
-        wa_send_text(to_user, message_text)
+        await wa_send_text_async(request.app.state.wa_http, to_user, message_text)
 
     return {
         "ok": True,
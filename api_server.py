@@ -11,20 +11,25 @@ if sys.platform.startswith("win"):
 # ============================================================
 
 import os
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 import re
 import uuid
 
+import httpx
 import requests
+from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy import text
-from fastapi import FastAPI, Request, Query, HTTPException, Header
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi import BackgroundTasks, FastAPI, Request, Query, HTTPException, Header
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
 from admin_ui.reception_dashboard import router as reception_router
 from database import AsyncSessionLocal
 from core.wa_dedupe_store_pg import ensure_wa_dedupe_table, claim_message_once
 from core.session_store_pg import ensure_sessions_table
 from core.appointment_schema import ensure_appointment_requests_table
-from whatsapp_controller import handle_message
+from whatsapp_controller import handle_message, WA_SESSION_BACKEND, _dispatch_pool
+from compliance.audit_bus import audit_bus
 
 WA_ACCESS_TOKEN = (os.getenv("WA_ACCESS_TOKEN", "") or "").strip()
 WA_PHONE_NUMBER_ID = (os.getenv("WA_PHONE_NUMBER_ID", "") or "").strip()
@@ -35,28 +40,53 @@ TENANT_ID = WA_DEFAULT_CLIENT
 
 ADMIN_TOKEN = (os.getenv("ADMIN_TOKEN", "") or "").strip()
 
+# Opt-in: ACK the webhook first and process the delivery afterwards. A crash or restart
+# after that 200 loses the message (Meta won't redeliver), so inline is the default.
+WEBHOOK_BACKGROUND = (os.getenv("WA_WEBHOOK_BACKGROUND", "false") or "false").strip().lower() in {"1", "true", "yes", "y"}
 
-def wa_send_text(to_wa_id: str, text_: str) -> Dict[str, Any]:
+# Webhook ACK body, encoded once (Meta only checks the 200)
+_ACK_BODY = b'{"ok":true}'
+
+
+def _ack() -> Response:
+    return Response(content=_ACK_BODY, media_type="application/json")
+
+
+WA_GRAPH_URL = f"https://graph.facebook.com/v20.0/{WA_PHONE_NUMBER_ID}/messages"
+
+
+def _new_wa_http() -> httpx.AsyncClient:
+    # One pooled client per app for Graph API sends (lifespan owns it: app.state.wa_http)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+
+
+def _wa_request(to_wa_id: str, text_: str) -> Optional[Dict[str, Any]]:
     if not WA_ACCESS_TOKEN or not WA_PHONE_NUMBER_ID:
         raise RuntimeError("Missing WA_ACCESS_TOKEN or WA_PHONE_NUMBER_ID")
 
     body = (text_ or "").strip()
     if not body:
-        return {"ok": False, "note": "empty_body"}
-
-    url = f"https://graph.facebook.com/v20.0/{WA_PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {WA_ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to_wa_id,
-        "type": "text",
-        "text": {"body": body[:4000]},
+        return None
+
+    return {
+        "headers": {
+            "Authorization": f"Bearer {WA_ACCESS_TOKEN}",
+            "Content-Type": "application/json",
+        },
+        "json": {
+            "messaging_product": "whatsapp",
+            "to": to_wa_id,
+            "type": "text",
+            "text": {"body": body[:4000]},
+        },
     }
 
-    r = requests.post(url, headers=headers, json=payload, timeout=30)
+
+def _wa_result(r) -> Dict[str, Any]:
+    # Works for both requests.Response and httpx.Response
     try:
         j = r.json()
     except Exception:
@@ -68,23 +98,24 @@ def wa_send_text(to_wa_id: str, text_: str) -> Dict[str, Any]:
     return j
 
 
-app = FastAPI(title="SupportPilot", version="0.1.0")
-# Reception Dashboard
-from admin_ui.reception_dashboard import router as reception_router
-app.include_router(reception_router)
-
-@app.api_route("/", methods=["GET", "HEAD"])
-async def root():
-    return {"ok": True, "service": "SupportPilot"}
+def wa_send_text(to_wa_id: str, text_: str) -> Dict[str, Any]:
+    """Blocking send, for scripts and sync callers; async handlers use wa_send_text_async."""
+    req = _wa_request(to_wa_id, text_)
+    if req is None:
+        return {"ok": False, "note": "empty_body"}
+    return _wa_result(requests.post(WA_GRAPH_URL, timeout=30, **req))
 
 
-@app.api_route("/health", methods=["GET", "HEAD"])
-async def health():
-    return {"ok": True}
+async def wa_send_text_async(http: httpx.AsyncClient, to_wa_id: str, text_: str) -> Dict[str, Any]:
+    """Async send through the app's shared client (handlers pass request.app.state.wa_http)."""
+    req = _wa_request(to_wa_id, text_)
+    if req is None:
+        return {"ok": False, "note": "empty_body"}
+    return _wa_result(await http.post(WA_GRAPH_URL, **req))
 
 
-@app.on_event("startup")
-async def _startup():
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
     print(
         "[startup] env:",
         "has_token=",
@@ -106,6 +137,50 @@ async def _startup():
 
     print("[startup] tables ensured")
 
+    if WA_SESSION_BACKEND == "redis":
+        from core.session_store_redis import open_pool
+        await open_pool()
+        print("[startup] redis session store ready")
+
+    # Shared pooled clients are created here, once; handlers read them from app.state
+    app.state.wa_http = _new_wa_http()
+
+    try:
+        yield
+    finally:
+        # In-flight ticket dispatches still submit audit events: let them finish first,
+        # then make sure queued audit events reach the log before the process exits
+        await asyncio.to_thread(_dispatch_pool.shutdown, wait=True)
+        await asyncio.to_thread(audit_bus.flush)
+
+        if WA_SESSION_BACKEND == "redis":
+            from core.session_store_redis import close_pool
+            await close_pool()
+
+        await app.state.wa_http.aclose()
+
+
+# orjson for every dict a route returns (admin/reception JSON); gzip only pays off above ~500 bytes
+app = FastAPI(
+    title="SupportPilot",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=_lifespan,
+)
+app.add_middleware(GZipMiddleware, minimum_size=500)
+# Reception Dashboard
+from admin_ui.reception_dashboard import router as reception_router
+app.include_router(reception_router)
+
+@app.api_route("/", methods=["GET", "HEAD"])
+async def root():
+    return {"ok": True, "service": "SupportPilot"}
+
+
+@app.api_route("/health", methods=["GET", "HEAD"])
+async def health():
+    return {"ok": True, "audit": audit_bus.stats()}
+
 
 # ✅ Admin reset — protected by ADMIN_TOKEN
 @app.get("/admin/reset-sessions")
@@ -122,6 +197,10 @@ async def admin_reset_sessions(
         raise HTTPException(status_code=403, detail="Forbidden")
 
     tenant = TENANT_ID
+    if WA_SESSION_BACKEND == "redis":
+        from core.session_store_redis import clear_tenant_sessions
+        await clear_tenant_sessions(tenant)
+
     async with AsyncSessionLocal() as db:
         await db.execute(
             text("DELETE FROM sessions WHERE tenant_id = :tenant_id"),
@@ -143,47 +222,80 @@ async def whatsapp_verify(
     raise HTTPException(status_code=403, detail="Verification failed")
 
 
-def _extract_text_messages(body: Dict[str, Any]) -> list[Dict[str, str]]:
-    out: list[Dict[str, str]] = []
-    entries = body.get("entry") or []
-    if not isinstance(entries, list):
-        return out
+# Inbound webhook shape (only the fields we read; everything else is ignored).
+# pydantic-core parses and validates the raw bytes in one pass.
+class _WaText(BaseModel):
+    body: str = ""
 
-    for entry in entries:
-        changes = (entry or {}).get("changes") or []
-        if not isinstance(changes, list):
-            continue
 
-        for ch in changes:
-            value = (ch or {}).get("value") or {}
-            if not isinstance(value, dict):
-                continue
+class _WaMessage(BaseModel):
+    id: str = ""
+    from_: str = Field(default="", alias="from")
+    type: str = ""
+    text: Optional[_WaText] = None
 
-            messages = value.get("messages") or []
-            if not isinstance(messages, list) or not messages:
-                continue
 
-            for msg in messages:
-                if not isinstance(msg, dict):
-                    continue
+class _WaMetadata(BaseModel):
+    phone_number_id: str = ""
+
+
+class _WaValue(BaseModel):
+    metadata: Optional[_WaMetadata] = None
+    # Validated one by one in _iter_text_messages: a malformed item skips only itself
+    messages: List[Any] = []
+
+
+class _WaChange(BaseModel):
+    value: Optional[_WaValue] = None
+
+
+class _WaEntry(BaseModel):
+    changes: List[_WaChange] = []
+
+
+class WaWebhook(BaseModel):
+    entry: List[_WaEntry] = []
+
+
+def _iter_text_messages(body: WaWebhook) -> Iterator[Dict[str, str]]:
+    """
+    Yield every inbound text message in a webhook POST.
+
+    Meta may batch several entries / changes / messages into one delivery;
+    all of them are yielded so none is dropped (and redelivered by Meta).
+    """
+    for entry in body.entry:
+        for ch in entry.changes:
+            value = ch.value
+            if value is None or not value.messages:
+                continue
 
-                msg_id = (msg.get("id") or "").strip()
-                from_wa = (msg.get("from") or "").strip()
-                msg_type = (msg.get("type") or "").strip().lower()
+            phone_id = value.metadata.phone_number_id.strip() if value.metadata else ""
 
-                if not from_wa or msg_type != "text":
+            for item in value.messages:
+                try:
+                    msg = _WaMessage.model_validate(item)
+                except ValidationError as e:
+                    print(f"[webhook] skipped malformed message: {e.error_count()} error(s)")
+                    continue
+                from_wa = msg.from_.strip()
+                if not from_wa or msg.type.strip().lower() != "text":
                     continue
 
-                text_in = ((msg.get("text") or {}).get("body") or "").strip()
+                text_in = (msg.text.body if msg.text else "").strip()
                 if not text_in:
                     continue
 
-                out.append({"msg_id": msg_id, "from_wa": from_wa, "text": text_in})
-
-    return out
+                yield {
+                    "msg_id": msg.id.strip(),
+                    "from_wa": from_wa,
+                    "text": text_in,
+                    "phone_id": phone_id or WA_PHONE_NUMBER_ID,
+                }
 
 
-_REF_RE = re.compile(r"appt_ref=([A-Z]{2,6}-\d{6}-\d{3,6})", re.IGNORECASE)
+# ASCII-only ids: re.ASCII keeps \d and case folding on the ASCII fast path
+_REF_RE = re.compile(r"appt_ref=([A-Z]{2,6}-\d{6}-\d{3,6})", re.IGNORECASE | re.ASCII)
 
 
 def _extract_or_make_request_id(payload: Dict[str, Any]) -> str:
@@ -296,34 +408,37 @@ async def _persist_engine_actions(
         )
 
 
-@app.post("/whatsapp/webhook")
-async def whatsapp_webhook(request: Request):
-    try:
-        body = await request.json()
-    except Exception:
-        return JSONResponse({"ok": True})
-
-    messages = _extract_text_messages(body)
-    if not messages:
-        return JSONResponse({"ok": True})
-
-    for m in messages:
+async def _process_webhook(body: WaWebhook, http: httpx.AsyncClient, acked: bool = False) -> None:
+    """
+    Dedupe, run the engine and send the reply for every text message in one delivery (in order).
+    acked: the 200 already went out (background mode), so a dedupe error can only be logged;
+    inline, it propagates and the 500 makes Meta redeliver.
+    """
+    for m in _iter_text_messages(body):
         msg_id = m["msg_id"]
         from_wa = m["from_wa"]
         text_in = m["text"]
+        phone_id = m["phone_id"]
 
         print(f"[webhook] incoming from={from_wa} msg_id={msg_id} text={text_in!r}")
 
         # dedupe
         if msg_id:
-            async with AsyncSessionLocal() as db:
-                claimed = await claim_message_once(
-                    db,
-                    tenant_id=TENANT_ID,
-                    msg_id=msg_id,
-                    wa_from=from_wa,
-                    phone_number_id=WA_PHONE_NUMBER_ID,
-                )
+            try:
+                async with AsyncSessionLocal() as db:
+                    claimed = await claim_message_once(
+                        db,
+                        tenant_id=TENANT_ID,
+                        msg_id=msg_id,
+                        wa_from=from_wa,
+                        phone_number_id=phone_id,
+                    )
+            except Exception as e:
+                print(f"[webhook] dedupe error msg_id={msg_id}:", repr(e))
+                if not acked:
+                    raise
+                # After the ACK nobody retries: skip this message, keep the rest of the delivery
+                continue
             if not claimed:
                 print(f"[webhook] duplicate ignored msg_id={msg_id}")
                 continue
@@ -356,8 +471,28 @@ async def whatsapp_webhook(request: Request):
         reply_clean = (reply_text or "").strip()
         if reply_clean:
             try:
-                wa_send_text(from_wa, reply_clean)
+                await wa_send_text_async(http, from_wa, reply_clean)
             except Exception as e:
                 print("[wa_send] error:", repr(e))
 
-    return JSONResponse({"ok": True})
\ No newline at end of file
+
+@app.post("/whatsapp/webhook")
+async def whatsapp_webhook(request: Request, background: BackgroundTasks):
+    raw = await request.body()
+    # Delivery/read status callbacks outnumber inbound messages and carry no
+    # "messages" key: ACK them without decoding the JSON at all
+    if b'"messages"' not in raw:
+        return _ack()
+    try:
+        body = WaWebhook.model_validate_json(raw)
+    except ValidationError as e:
+        print(f"[webhook] dropped malformed delivery: {e.error_count()} error(s)")
+        return _ack()
+
+    if WEBHOOK_BACKGROUND:
+        # Runs after the 200 is sent: Meta's delivery timeout no longer covers
+        # engine, DB and Graph API latency (dedupe still guards redeliveries)
+        background.add_task(_process_webhook, body, request.app.state.wa_http, True)
+    else:
+        await _process_webhook(body, request.app.state.wa_http)
+    return _ack()
\ No newline at end of file
@@ -0,0 +1,146 @@
+# compliance/audit_bus.py
+# -----------------------------------
+# Background audit queue (batched, off the request path)
+# -----------------------------------
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from compliance.audit_logger import default_sink
+
+
+# Tunable per deployment: larger/longer batches mean fewer sink writes, but events
+# reach the audit log later (flush() on shutdown still drains everything).
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_TRAIL_BUFFER_MAX_SIZE", "100"))                   # max events per sink write
+AUDIT_BATCH_WAIT_SECONDS = float(os.getenv("AUDIT_TRAIL_BUFFER_FLUSH_INTERVAL", "0.05"))  # max wait for a batch to fill up
+AUDIT_HIGH_WATER = 10_000         # queue length where submit() starts dropping events
+
+
+class AuditBus:
+    """
+    Queues audit events and writes them from a single daemon thread.
+
+    - submit() never raises and never does I/O on the caller's thread
+    - the consumer sends whatever is queued (up to AUDIT_BATCH_SIZE) in one
+      sink call, waiting at most AUDIT_BATCH_WAIT_SECONDS for more events
+    - above AUDIT_HIGH_WATER queued events, submit() drops the event at once
+      (it is called from the event loop, so it must never block)
+    - the sink is the JSONL file, or a Redis stream when AUDIT_REDIS_STREAM is set
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List[Dict[str, Any]]], None] = default_sink,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        batch_wait: float = AUDIT_BATCH_WAIT_SECONDS,
+        high_water: int = AUDIT_HIGH_WATER,
+    ):
+        self._sink = sink
+        self._batch_size = max(1, int(batch_size))
+        self._batch_wait = max(0.0, float(batch_wait))
+        self._q: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, int(high_water)))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self.dropped = 0
+        self.sink_errors = 0  # events lost because the sink raised (one writer at a time)
+
+    # -------------------------------------------------
+    # Producer side
+    # -------------------------------------------------
+
+    def submit(self, event: Dict[str, Any]) -> None:
+        if not isinstance(event, dict):
+            return
+
+        self._ensure_started()
+        try:
+            self._q.put_nowait(event)
+        except queue.Full:
+            # Audit must never break (or stall) production
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters for health/metrics endpoints.
+        """
+        return {
+            "queued": self._q.qsize(),
+            "dropped": self.dropped,
+            "sink_errors": self.sink_errors,
+            "high_water": self._q.maxsize,
+        }
+
+    def flush(self) -> None:
+        """
+        Blocks until every submitted event has reached the sink.
+        Call on shutdown.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._drain_now()
+            return
+        self._q.join()
+
+    # -------------------------------------------------
+    # Consumer side
+    # -------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-bus", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self._batch_wait
+
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._q.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _drain_now(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        while True:
+            try:
+                batch.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self._sink(batch)
+        except Exception as e:
+            self.sink_errors += len(batch)
+            print(f"[audit] sink error, lost events={len(batch)}:", repr(e))
+        finally:
+            for _ in batch:
+                self._q.task_done()
+
+
+audit_bus = AuditBus()
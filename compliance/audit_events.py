@@ -1,10 +1,23 @@
 # compliance/audit_events.py
 
-from datetime import datetime
+import time
+
+
+# (second, "YYYY-MM-DDTHH:MM:SS") of the last call; one tuple so readers on other
+# threads never see a second paired with another second's prefix
+_prefix_cache = (-1, "")
 
 
 def _timestamp():
-    return datetime.utcnow().isoformat() + "Z"
+    # Same shape as datetime.utcnow().isoformat() + "Z" (always with microseconds),
+    # formatted straight from the clock; strftime runs at most once per second
+    global _prefix_cache
+    sec, ns = divmod(time.time_ns(), 1_000_000_000)
+    cached_sec, prefix = _prefix_cache
+    if sec != cached_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _prefix_cache = (sec, prefix)
+    return f"{prefix}.{ns // 1000:06d}Z"
 
 
 def conversation_restart_event(user_id: str, conversation_version: int, restart_count: int):
@@ -17,8 +30,17 @@ def conversation_restart_event(user_id: str, conversation_version: int, restart_
     }
 
 
-def escalation_event(user_id: str, rule: str, priority: str, conversation_version: int):
-    return {
+def escalation_event(
+    user_id: str,
+    rule: str,
+    priority: str,
+    conversation_version: int,
+    lang: str = None,
+    vendor_status: str = None,
+):
+    # One event per escalation: language + vendor outcome ride along
+    # instead of being logged as separate events
+    event = {
         "event_type": "auto_escalation",
         "user_id": user_id,
         "decision_rule": rule,
@@ -26,6 +48,11 @@ def escalation_event(user_id: str, rule: str, priority: str, conversation_versio
         "conversation_version": conversation_version,
         "timestamp": _timestamp(),
     }
+    if lang is not None:
+        event["lang"] = lang
+    if vendor_status is not None:
+        event["vendor_status"] = vendor_status
+    return event
 
 
 def agent_language_violation_event(
@@ -1,11 +1,38 @@
 # compliance/audit_logger.py
 
 import json
+import os
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
 
 AUDIT_LOG_PATH = Path("compliance/audit_log.jsonl")
 
+# Optional Redis Streams sink (e.g. AUDIT_REDIS_STREAM=wa:audit); empty = JSONL file only.
+# A consumer group drains the stream into long-term storage.
+AUDIT_REDIS_STREAM = (os.getenv("AUDIT_REDIS_STREAM") or "").strip()
+AUDIT_REDIS_URL = (os.getenv("WA_REDIS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379/0").strip()
+AUDIT_STREAM_MAXLEN = int(os.getenv("AUDIT_REDIS_STREAM_MAXLEN", "1000000"))
+
+_stream_client = None
+
+
+def dumps_line(obj) -> str:
+    """
+    One JSON line (with trailing newline) — shared serializer for audit records.
+    orjson when available (UTF-8 output, same as ensure_ascii=False), stdlib json otherwise.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE).decode("utf-8")
+        except TypeError:
+            pass  # e.g. non-str keys: stdlib json coerces them
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
 
 def log_event(event: dict):
     """
@@ -20,8 +47,62 @@ def log_event(event: dict):
         AUDIT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
         with open(AUDIT_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.write(dumps_line(event))
+
+    except Exception:
+        # Fail silently — audit must never break production
+        pass
+
+
+def log_events(events: list):
+    """
+    Batched variant of log_event: one open + one write for the whole batch.
+    Same guarantees (never throws, append-only).
+    """
+
+    try:
+        lines = [dumps_line(event) for event in (events or []) if isinstance(event, dict)]
+        if not lines:
+            return
+
+        AUDIT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(AUDIT_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
 
     except Exception:
         # Fail silently — audit must never break production
         pass
+
+
+def _redis_stream_client():
+    global _stream_client
+    if _stream_client is None:
+        import redis  # only needed when the stream sink is enabled
+
+        _stream_client = redis.Redis.from_url(AUDIT_REDIS_URL, socket_timeout=2)
+    return _stream_client
+
+
+def stream_events(events: list):
+    """
+    Batched XADD to AUDIT_REDIS_STREAM: one pipelined round trip per batch,
+    approximate MAXLEN trimming (~) so each XADD stays O(1).
+    Falls back to the JSONL file if Redis is unreachable; never throws.
+    """
+
+    lines = [dumps_line(event) for event in (events or []) if isinstance(event, dict)]
+    if not lines:
+        return
+
+    try:
+        pipe = _redis_stream_client().pipeline(transaction=False)
+        for line in lines:
+            pipe.xadd(AUDIT_REDIS_STREAM, {"event": line.rstrip("\n")}, maxlen=AUDIT_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+    except Exception:
+        log_events(events)
+
+
+# Sink used by compliance.audit_bus
+default_sink = stream_events if AUDIT_REDIS_STREAM else log_events
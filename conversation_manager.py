@@ -161,7 +161,20 @@ def log_message(wa_id: str, direction: str, body: str) -> None:
 # ---------------------------
 # Simple intent detection
 # ---------------------------
-_ORDER_RE = re.compile(r"\b([A-Z0-9]{6,20})\b", re.I)
+# Order ids must contain a digit (the lookahead rejects plain words like "refund"/"problem"
+# before scanning the token); explicit a-z instead of re.I avoids per-char case folding.
+_ORDER_RE = re.compile(r"\b(?=[A-Za-z]*[0-9])([A-Za-z0-9]{6,20})\b", re.ASCII)
+
+
+# Whole-message phrases (module-level, built once); none of them contains a
+# reset/handoff keyword, so checking them first keeps the original precedence.
+_EXACT_INTENTS = {
+    **dict.fromkeys(("hi", "hello", "hey", "salam", "assalam"), "greeting"),
+    **dict.fromkeys(("thanks", "thank you", "thx"), "thanks"),
+}
+_RESET_RE = re.compile(r"reset|start over")
+_HANDOFF_RE = re.compile(r"agent|human|call me")
+_COMPLAINT_RE = re.compile(r"not working|refund|late|complain|angry|bad|problem|issue")
 
 
 def detect_intent(text: str) -> str:
@@ -169,21 +182,16 @@ def detect_intent(text: str) -> str:
 
     if not t:
         return "empty"
-    if t in {"hi", "hello", "hey", "salam", "assalam"}:
-        return "greeting"
-    if "reset" in t or "start over" in t:
+    exact = _EXACT_INTENTS.get(t)
+    if exact:
+        return exact
+    if _RESET_RE.search(t):
         return "reset"
-    if t in {"thanks", "thank you", "thx"}:
-        return "thanks"
-    if "agent" in t or "human" in t or "call me" in t:
+    if _HANDOFF_RE.search(t):
         return "handoff"
     if _ORDER_RE.search(text or ""):
         return "order_id"
-    if any(k in t for k in [
-        "not working", "refund", "late",
-        "complain", "angry", "bad",
-        "problem", "issue"
-    ]):
+    if _COMPLAINT_RE.search(t):
         return "complaint"
     return "general"
 
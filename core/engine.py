@@ -9,10 +9,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, List, Tuple
+from typing import Any, Callable, Dict, Optional, List, Tuple
 from datetime import datetime, timezone, timedelta
 import random
 import re
+import time
+
+from core.text_match import keyword_re
 
 STATUS_ACTIVE = "ACTIVE"
 STATUS_COMPLETED = "COMPLETED"
@@ -126,8 +129,20 @@ def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+# (second, "YYYY-MM-DDTHH:MM:SS") of the last _utcnow_iso() call
+_iso_prefix_cache: Tuple[int, str] = (-1, "")
+
+
 def _utcnow_iso() -> str:
-    return _utcnow().isoformat()
+    # Same text as _utcnow().isoformat() (microseconds always present), built from
+    # time.time_ns() without a datetime object; strftime at most once per second
+    global _iso_prefix_cache
+    sec, ns = divmod(time.time_ns(), 1_000_000_000)
+    cached_sec, prefix = _iso_prefix_cache
+    if sec != cached_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _iso_prefix_cache = (sec, prefix)
+    return f"{prefix}.{ns // 1000:06d}+00:00"
 
 
 def _parse_iso(s: Optional[str]) -> Optional[datetime]:
@@ -139,12 +154,14 @@ def _parse_iso(s: Optional[str]) -> Optional[datetime]:
         return None
 
 
+# _low() runs several times per turn (intent, menu, digit and thanks checks):
+# one translate pass each instead of six .replace() calls + a digit pass
+_CLEAN_TABLE = str.maketrans("", "", "،,٫;؛。")
+_LOW_TABLE = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789", "،,٫;؛。")
+
+
 def _clean_input(text: str) -> str:
-    t = (text or "").strip()
-    for ch in ["،", ",", "٫", ";", "؛", "。"]:
-        t = t.replace(ch, "")
-    t = " ".join(t.split())
-    return t
+    return " ".join((text or "").translate(_CLEAN_TABLE).split())
 
 
 def _norm(t: str) -> str:
@@ -152,7 +169,7 @@ def _norm(t: str) -> str:
 
 
 def _low(t: str) -> str:
-    return _normalize_digits(_clean_input(t).lower())
+    return " ".join((t or "").translate(_LOW_TABLE).split()).lower()
 
 
 def _lang(x: str) -> str:
@@ -171,17 +188,32 @@ def _to_int(t: str, default: int = -1) -> int:
         return default
 
 
+_THANKS = frozenset({"thanks", "thank you", "thx", "شكرا", "شكراً", "شكرًا", "مشكور", "الله يعطيك العافية"})
+_THANKS_MAX_LEN = max(map(len, _THANKS))
+_MENU_KEYS = frozenset({"0", "٠"})
+
+
+def _is_thanks_low(low: str) -> bool:
+    # Length gate first: long messages skip hashing the whole text for a set probe
+    return len(low) <= _THANKS_MAX_LEN and low in _THANKS
+
+
 def _is_thanks(text: str) -> bool:
-    tl = _low(text)
-    return tl in {"thanks", "thank you", "thx", "شكرا", "شكراً", "شكرًا", "مشكور", "الله يعطيك العافية"}
+    return _is_thanks_low(_low(text))
 
 
 def _set_bot(sess: Dict[str, Any], msg: str) -> None:
     sess["last_bot_message"] = msg
-    sess["last_bot_ts"] = _utcnow_iso()
+    sess["last_bot_ts"] = time.time()  # epoch seconds; nothing parses it back
     sess["last_step"] = sess.get("state")
 
 
+def _respond(sess: Dict[str, Any], out: str, actions: Optional[List[Dict[str, Any]]] = None) -> EngineResult:
+    """Single exit for a bot turn: stamp the reply on the session and wrap it."""
+    _set_bot(sess, out)
+    return EngineResult(out, sess, actions if actions is not None else [])
+
+
 def default_session(user_id: str) -> Dict[str, Any]:
     return {
         "engine": ENGINE_MARKER,
@@ -225,18 +257,26 @@ def default_session(user_id: str) -> Dict[str, Any]:
     }
 
 
+# Immutable values only; pending_patient is a fresh dict per reset (it gets mutated)
+_FLOW_RESET: Dict[str, Any] = {
+    **dict.fromkeys(
+        [
+            "intent",
+            "dept_key", "dept_label",
+            "doctor_key", "doctor_label",
+            "date", "slot",
+            "patient_name", "patient_mobile", "patient_id",
+            "appt_ref",
+            "confirm_expires_at",
+        ],
+        None,
+    ),
+    "mistakes": 0,
+}
+
+
 def _reset_flow_fields(sess: Dict[str, Any]) -> None:
-    for k in [
-        "intent",
-        "dept_key", "dept_label",
-        "doctor_key", "doctor_label",
-        "date", "slot",
-        "patient_name", "patient_mobile", "patient_id",
-        "appt_ref",
-        "confirm_expires_at",
-    ]:
-        sess[k] = None
-    sess["mistakes"] = 0
+    sess.update(_FLOW_RESET)
     sess["pending_patient"] = {"name": None, "mobile": None, "pid": None}
 
 
@@ -247,8 +287,12 @@ def _seconds_since(prev_iso: Optional[str]) -> Optional[float]:
     return (_utcnow() - dt).total_seconds()
 
 
-def _session_expired_from(prev_iso: Optional[str]) -> bool:
-    sec = _seconds_since(prev_iso)
+def _session_expired_from(prev_iso: Optional[str], prev_epoch: Any = None) -> bool:
+    # Float delta when the epoch twin is stored; ISO parse only for older sessions
+    if isinstance(prev_epoch, (int, float)):
+        sec = time.time() - prev_epoch
+    else:
+        sec = _seconds_since(prev_iso)
     if sec is None:
         return False
     return sec >= SESSION_EXPIRE_SECONDS
@@ -414,20 +458,97 @@ def _patient_ask_name_only(lang: str) -> str:
     return "Thanks. Please send your full name only." + _footer(lang)
 
 
+# Static info replies, footer included, keyed by (topic, lang) — built once at import
+_CANNED: Dict[Tuple[str, str], str] = {
+    ("insurance", "ar"): INSURANCE_AR + _footer("ar"),
+    ("insurance", "en"): INSURANCE_EN + _footer("en"),
+    ("timings", "ar"): CLINIC_TIMINGS_AR + _footer("ar"),
+    ("timings", "en"): CLINIC_TIMINGS_EN + _footer("en"),
+    ("location", "ar"): LOCATION_AR + _footer("ar"),
+    ("location", "en"): LOCATION_EN + _footer("en"),
+    ("contact", "ar"): CONTACT_AR + _footer("ar"),
+    ("contact", "en"): CONTACT_EN + _footer("en"),
+}
+
+
+def _canned(topic: str, lang: str) -> str:
+    return _CANNED[(topic, "ar" if lang == "ar" else "en")]
+
+
+# Fixed turn replies keyed by (key, lang) — built once instead of branching per turn
+_REPLIES: Dict[Tuple[str, str], str] = {
+    ("reception", "ar"): "تم تحويلكم للتحدث مع موظف الاستقبال ✅ الرجاء الانتظار... (للعودة للقائمة اكتب 0)",
+    ("reception", "en"): "Connecting you to speak to Reception ✅ Please wait... (Reply 0 for menu)",
+    ("thanks", "ar"): "العفو ✅ إذا احتجت أي شيء آخر اكتب 0 لعرض القائمة.",
+    ("thanks", "en"): "You’re welcome ✅ If you need anything else, reply 0 for the menu.",
+    ("reschedule_lookup", "ar"): "يرجى إدخال رقم المرجع أو رقم الجوال المسجل.",
+    ("reschedule_lookup", "en"): "Please enter your reference number or registered mobile.",
+    ("cancel_lookup", "ar"): "يرجى إدخال رقم المرجع أو رقم الجوال المسجل لإتمام الإلغاء.",
+    ("cancel_lookup", "en"): "Please enter your reference number or registered mobile to cancel.",
+    ("invalid_menu", "ar"): "يرجى اختيار رقم صحيح من القائمة.",
+    ("invalid_menu", "en"): "Please choose a valid menu number.",
+    ("invalid_reschedule_ref", "ar"): "المدخل غير صحيح. أدخل رقم المرجع (مثل SSH-260301-1234) أو رقم الجوال.",
+    ("invalid_reschedule_ref", "en"): "Invalid input. Enter your reference (e.g., SSH-260301-1234) or your mobile number.",
+    ("reschedule_not_found", "ar"): "لم نعثر على حجز مرتبط بهذه البيانات.\nيرجى التأكد من الرقم والمحاولة مرة أخرى أو إدخال رقم المرجع.\n",
+    ("reschedule_not_found", "en"): "We could not find any booking linked to this information.\nPlease check and try again, or enter your booking reference.\n",
+    ("invalid_cancel_ref", "ar"): "المدخل غير صحيح. أدخل رقم المرجع أو رقم الجوال.",
+    ("invalid_cancel_ref", "en"): "Invalid input. Enter your reference or your mobile number.",
+    ("cancel_not_found", "ar"): "لم نعثر على موعد مرتبط بهذه البيانات لإلغائه.\nيرجى التأكد من الرقم والمحاولة مرة أخرى أو إدخال رقم المرجع.\n",
+    ("cancel_not_found", "en"): "We could not find any appointment linked to this information to cancel.\nPlease check and try again, or enter your reference.\n",
+    ("invalid_specialty", "ar"): "يرجى اختيار تخصص صحيح.",
+    ("invalid_specialty", "en"): "Please choose a valid specialty.",
+    ("invalid_doctor", "ar"): "يرجى اختيار طبيب صحيح.",
+    ("invalid_doctor", "en"): "Please choose a valid doctor.",
+    ("date_format", "ar"): "صيغة التاريخ غير صحيحة. مثال: 2026-03-10 أو 10-03-2026 أو 10/03/2026",
+    ("date_format", "en"): "Date format is invalid. Example: 2026-03-10 or 10-03-2026 or 10/03/2026",
+    ("date_invalid", "ar"): "التاريخ غير صالح. يرجى إدخال تاريخ صحيح.",
+    ("date_invalid", "en"): "That date is not valid. Please enter a valid date.",
+    ("past_date", "ar"): "لا يمكن اختيار تاريخ سابق. يرجى اختيار تاريخ قادم.",
+    ("past_date", "en"): "Past dates are not allowed. Please choose a future date.",
+    ("invalid_slot", "ar"): "يرجى اختيار رقم فترة صحيح.",
+    ("invalid_slot", "en"): "Please choose a valid slot number.",
+    ("invalid_patient", "ar"): "فضلاً أرسل الاسم الكامل ورقم جوال صحيح.",
+    ("invalid_patient", "en"): "Please send full name and a valid mobile number.",
+    ("summary_expired", "ar"): "⏳ انتهت صلاحية ملخص الحجز. حفاظًا على الدقة، يرجى اختيار الفترة مرة أخرى.",
+    ("summary_expired", "en"): "⏳ This booking summary has expired. To ensure accuracy, please select the slot again.",
+    ("invalid_confirm", "ar"): "يرجى اختيار 1 أو 2 أو 3.",
+    ("invalid_confirm", "en"): "Please choose 1, 2, or 3.",
+    ("new_date", "ar"): "تمام. اختر تاريخ جديد للموعد.\n\n",
+    ("new_date", "en"): "Okay. Please choose a new appointment date.\n\n",
+    ("request_cancelled", "ar"): "تم إلغاء الطلب. للمتابعة اختر من القائمة.\n\n",
+    ("request_cancelled", "en"): "Request cancelled. Please choose from the menu.\n\n",
+}
+
+
+def _reply(key: str, lang: str) -> str:
+    return _REPLIES[(key, "ar" if lang == "ar" else "en")]
+
+
+# Parameterized replies: one template per language, formatted per turn
+_TEMPLATES: Dict[Tuple[str, str], str] = {
+    ("dept_selected", "ar"): "تم اختيار تخصص *{label}* ✅\n\n",
+    ("dept_selected", "en"): "Selected specialty: *{label}* ✅\n\n",
+}
+
+
+def _template(key: str, lang: str, **fields: Any) -> str:
+    return _TEMPLATES[(key, "ar" if lang == "ar" else "en")].format(**fields)
+
+
 def _insurance_text(lang: str) -> str:
-    return (INSURANCE_AR if lang == "ar" else INSURANCE_EN) + _footer(lang)
+    return _canned("insurance", lang)
 
 
 def _timings_text(lang: str) -> str:
-    return (CLINIC_TIMINGS_AR if lang == "ar" else CLINIC_TIMINGS_EN) + _footer(lang)
+    return _canned("timings", lang)
 
 
 def _location_text(lang: str) -> str:
-    return (LOCATION_AR if lang == "ar" else LOCATION_EN) + _footer(lang)
+    return _canned("location", lang)
 
 
 def _contact_text(lang: str) -> str:
-    return (CONTACT_AR if lang == "ar" else CONTACT_EN) + _footer(lang)
+    return _canned("contact", lang)
 
 
 def _soft_invalid(sess: Dict[str, Any], lang: str, msg: str) -> str:
@@ -645,6 +766,16 @@ _DEPT_SYNONYMS: Dict[str, List[str]] = {
 }
 
 
+_BOOK_RE = keyword_re(_BOOK_AR + _BOOK_EN)
+_INQUIRY_RE = keyword_re(_INQUIRY_AR + _INQUIRY_EN)
+# Dept order matters (first matching dept wins), so keep one pattern per dept
+_DEPT_RES: List[Tuple[str, "re.Pattern[str]"]] = [
+    (key, keyword_re([_low(w) for w in words])) for key, words in _DEPT_SYNONYMS.items()
+]
+# Shorter (or all-digit) input cannot contain any book/inquiry keyword
+_INTENT_MIN_LEN = min(len(_low(w)) for w in _BOOK_AR + _BOOK_EN + _INQUIRY_AR + _INQUIRY_EN if w)
+
+
 def _detect_language_from_text(text: str) -> Optional[str]:
     t = text or ""
     if _AR_CHARS_RE.search(t):
@@ -654,20 +785,25 @@ def _detect_language_from_text(text: str) -> Optional[str]:
     return None
 
 
-def _detect_dept_key(text: str) -> Optional[str]:
-    t = _low(text)
-    for key, words in _DEPT_SYNONYMS.items():
-        for w in words:
-            if _low(w) in t:
-                return key
+def _dept_key_low(t: str) -> Optional[str]:
+    for key, rx in _DEPT_RES:
+        if rx.search(t):
+            return key
     return None
 
 
+def _detect_dept_key(text: str) -> Optional[str]:
+    return _dept_key_low(_low(text))
+
+
 def _detect_intent(text: str) -> Optional[str]:
     t = _low(text)
-    if any(k in t for k in _BOOK_AR) or any(k in t for k in _BOOK_EN):
+    # Menu digits ("1", "99") and one-letter replies skip every keyword scan
+    if len(t) < _INTENT_MIN_LEN or t.isdigit():
+        return None
+    if _BOOK_RE.search(t):
         return "BOOK"
-    if (any(k in t for k in _INQUIRY_AR) or any(k in t for k in _INQUIRY_EN)) and _detect_dept_key(text):
+    if _INQUIRY_RE.search(t) and _dept_key_low(t):
         return "SPECIALTY_INQUIRY"
     return None
 
@@ -703,6 +839,412 @@ def _doctor_info_reply(sess: Dict[str, Any], lang: str, dept_key: str) -> str:
     )
 
 
+# MAIN MENU routing
+def _turn_menu(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    if not raw:
+        out = _main_menu(lang)
+        return _respond(sess, out)
+
+    # If user is in Specialty Inquiry context and presses 1 => book directly for same dept
+    if _is_digit_choice(raw) and sess.get("intent") == "SPECIALTY_INQUIRY" and sess.get("dept_key"):
+        c = _to_int(raw)
+        dept_key = sess.get("dept_key")
+        if c == 1 and dept_key in DOCTORS_BY_DEPT_KEY:
+            _reset_flow_fields(sess)
+            sess["intent"] = "BOOK"
+            sess["dept_key"] = dept_key
+            sess["dept_label"] = _dept_label(dept_key, lang)
+            sess["state"] = STATE_BOOK_DOCTOR
+            sess["last_step"] = STATE_BOOK_DOCTOR
+
+            out = _template("dept_selected", lang, label=sess["dept_label"]) + _doctor_prompt(lang, dept_key)
+
+            return _respond(sess, out)
+
+    if _is_digit_choice(raw):
+        choice = _to_int(raw)
+
+        if choice == 1:
+            _reset_flow_fields(sess)
+            sess["intent"] = "BOOK"
+            sess["state"] = STATE_BOOK_DEPT
+            sess["last_step"] = STATE_BOOK_DEPT
+            out = _dept_prompt(lang)
+            return _respond(sess, out)
+
+        if choice == 2:
+            _reset_flow_fields(sess)
+            sess["intent"] = "RESCHEDULE"
+            sess["state"] = STATE_RESCHEDULE_LOOKUP
+            sess["last_step"] = STATE_RESCHEDULE_LOOKUP
+            out = _reply("reschedule_lookup", lang) + _footer(lang)
+            return _respond(sess, out)
+
+        if choice == 3:
+            _reset_flow_fields(sess)
+            sess["intent"] = "CANCEL"
+            sess["state"] = STATE_CANCEL_LOOKUP
+            sess["last_step"] = STATE_CANCEL_LOOKUP
+            out = _reply("cancel_lookup", lang) + _footer(lang)
+            return _respond(sess, out)
+
+        if choice == 4:
+            _reset_flow_fields(sess)
+            sess["intent"] = "SPECIALTY_INQUIRY"
+            sess["state"] = STATE_BOOK_DEPT
+            sess["last_step"] = STATE_BOOK_DEPT
+            out = _dept_prompt(lang)
+            return _respond(sess, out)
+
+        if choice == 5:
+            out = _timings_text(lang)
+            return _respond(sess, out)
+
+        if choice == 6:
+            out = _insurance_text(lang)
+            return _respond(sess, out)
+
+        if choice == 7:
+            out = _location_text(lang)
+            return _respond(sess, out)
+
+        if choice == 8:
+            out = _contact_text(lang)
+            return _respond(sess, out)
+
+        if choice == 99:
+            sess["state"] = STATE_ESCALATION
+            sess["last_step"] = STATE_ESCALATION
+            sess["escalation_flag"] = True
+            out = _reply("reception", lang)
+            return _respond(sess, out, [{"type": "ESCALATE", "reason": "user_requested_reception"}])
+
+        msg = _reply("invalid_menu", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _main_menu(lang)
+        return _respond(sess, out)
+
+    # Free text in menu: try intent + dept
+    intent = _detect_intent(message_text)
+    dept_key = _detect_dept_key(message_text)
+
+    if intent == "SPECIALTY_INQUIRY" and dept_key:
+        sess["intent"] = "SPECIALTY_INQUIRY"
+        sess["dept_key"] = dept_key
+        sess["dept_label"] = _dept_label(dept_key, lang)
+        out = _doctor_info_reply(sess, lang, dept_key)
+        return _respond(sess, out)
+
+    if intent == "BOOK" and dept_key and dept_key in DOCTORS_BY_DEPT_KEY:
+        _reset_flow_fields(sess)
+        sess["intent"] = "BOOK"
+        sess["dept_key"] = dept_key
+        sess["dept_label"] = _dept_label(dept_key, lang)
+        sess["state"] = STATE_BOOK_DOCTOR
+        sess["last_step"] = STATE_BOOK_DOCTOR
+
+        out = _template("dept_selected", lang, label=sess["dept_label"]) + _doctor_prompt(lang, dept_key)
+
+        return _respond(sess, out)
+
+    out = _main_menu(lang)
+    return _respond(sess, out)
+
+
+# ✅ RESCHEDULE LOOKUP
+def _turn_reschedule_lookup(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    ref_or_mobile = raw.strip()
+    is_ref = _looks_like_reference(ref_or_mobile)
+    is_mobile = _valid_mobile(ref_or_mobile)
+
+    if not (is_ref or is_mobile):
+        msg = _reply("invalid_reschedule_ref", lang)
+        out = _soft_invalid(sess, lang, msg) + _footer(lang)
+        return _respond(sess, out)
+
+    out = _reply("reschedule_not_found", lang) + _footer(lang)
+    return _respond(sess, out)
+
+
+# ✅ CANCEL LOOKUP
+def _turn_cancel_lookup(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    ref_or_mobile = raw.strip()
+    is_ref = _looks_like_reference(ref_or_mobile)
+    is_mobile = _valid_mobile(ref_or_mobile)
+
+    if not (is_ref or is_mobile):
+        msg = _reply("invalid_cancel_ref", lang)
+        out = _soft_invalid(sess, lang, msg) + _footer(lang)
+        return _respond(sess, out)
+
+    out = _reply("cancel_not_found", lang) + _footer(lang)
+    return _respond(sess, out)
+
+
+# BOOKING FLOWS
+def _turn_book_dept(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    # ✅ accept 21 -> 12
+    if _is_digit_choice(raw) and _to_int(raw) == 21 and len(DEPTS) >= 12:
+        raw = "12"
+
+    # ✅ accept 01 as 10 (physio)
+    if _is_digit_choice(raw) and _to_int(raw) == 1 and raw.strip().startswith("0") and len(DEPTS) >= 10:
+        raw = "10"
+
+    idx = _to_int(raw, -1) - 1 if _is_digit_choice(raw) else -1
+    dept_key = None
+    dept_label = None
+
+    if 0 <= idx < len(DEPTS):
+        dept_key = DEPTS[idx]["key"]
+        dept_label = DEPTS[idx]["ar"] if lang == "ar" else DEPTS[idx]["en"]
+    else:
+        k2 = _detect_dept_key(message_text)
+        if k2:
+            dept_key = k2
+            dept_label = _dept_label(k2, lang)
+
+    if not dept_key:
+        msg = _reply("invalid_specialty", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _dept_prompt(lang)
+        return _respond(sess, out)
+
+    sess["dept_key"] = dept_key
+    sess["dept_label"] = dept_label
+    sess["mistakes"] = 0
+
+    if sess.get("intent") == "SPECIALTY_INQUIRY":
+        sess["state"] = STATE_MENU
+        sess["last_step"] = STATE_MENU
+        out = _doctor_info_reply(sess, lang, dept_key)
+        return _respond(sess, out)
+
+    sess["state"] = STATE_BOOK_DOCTOR
+    sess["last_step"] = STATE_BOOK_DOCTOR
+    out = _doctor_prompt(lang, dept_key)
+    return _respond(sess, out)
+
+
+def _turn_book_doctor(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    docs = DOCTORS_BY_DEPT_KEY.get(sess.get("dept_key") or "", [])
+    idx = _to_int(raw, -1) - 1 if _is_digit_choice(raw) else -1
+
+    chosen_label = None
+    chosen_key = None
+
+    if 0 <= idx < len(docs):
+        chosen_key = docs[idx].get("key")
+        chosen_label = docs[idx]["ar"] if lang == "ar" else docs[idx]["en"]
+    else:
+        for doc in docs:
+            if _low(doc["ar"]) in low or _low(doc["en"]) in low:
+                chosen_key = doc.get("key")
+                chosen_label = doc["ar"] if lang == "ar" else doc["en"]
+                break
+
+    if not chosen_label:
+        msg = _reply("invalid_doctor", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _doctor_prompt(lang, sess.get("dept_key") or "")
+        return _respond(sess, out)
+
+    sess["doctor_key"] = chosen_key
+    sess["doctor_label"] = chosen_label
+    sess["mistakes"] = 0
+    sess["state"] = STATE_BOOK_DATE
+    sess["last_step"] = STATE_BOOK_DATE
+    out = _date_prompt(lang)
+    return _respond(sess, out)
+
+
+def _turn_book_date(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    norm_ymd, err = _parse_date_any(message_text)
+    if not norm_ymd:
+        msg = _reply("date_format" if err == "format" else "date_invalid", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _date_prompt(lang)
+        return _respond(sess, out)
+
+    if _is_past_date(norm_ymd):
+        msg = _reply("past_date", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _date_prompt(lang)
+        return _respond(sess, out)
+
+    sess["date"] = norm_ymd
+    sess["mistakes"] = 0
+    sess["state"] = STATE_BOOK_SLOT
+    sess["last_step"] = STATE_BOOK_SLOT
+    out = _slot_prompt(lang, norm_ymd)
+    return _respond(sess, out)
+
+
+def _turn_book_slot(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    idx = _to_int(raw, -1) - 1 if _is_digit_choice(raw) else -1
+    if not (0 <= idx < len(SLOTS)):
+        msg = _reply("invalid_slot", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _slot_prompt(lang, sess.get("date") or "")
+        return _respond(sess, out)
+
+    sess["slot"] = SLOTS[idx]
+    sess["mistakes"] = 0
+    sess["state"] = STATE_BOOK_PATIENT
+    sess["last_step"] = STATE_BOOK_PATIENT
+    out = _patient_prompt_full(lang)
+    return _respond(sess, out)
+
+
+# ✅ THIS BLOCK EXISTS (patient capture) — your repo version likely missed it
+def _turn_book_patient(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    pending = sess.get("pending_patient") or {"name": None, "mobile": None, "pid": None}
+    if not isinstance(pending, dict):
+        pending = {"name": None, "mobile": None, "pid": None}
+
+    name, mobile, pid = _extract_name_mobile_id(message_text)
+
+    if name and not pending.get("name"):
+        pending["name"] = name
+    if mobile and not pending.get("mobile"):
+        pending["mobile"] = mobile
+    if pid and not pending.get("pid"):
+        pending["pid"] = pid
+
+    sess["pending_patient"] = pending
+
+    if pending.get("name") and not pending.get("mobile"):
+        out = _patient_ask_mobile_only(lang)
+        return _respond(sess, out)
+
+    if pending.get("mobile") and not pending.get("name"):
+        out = _patient_ask_name_only(lang)
+        return _respond(sess, out)
+
+    if not pending.get("name") or not _valid_mobile(pending.get("mobile")):
+        msg = _reply("invalid_patient", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _patient_prompt_full(lang)
+        return _respond(sess, out)
+
+    sess["patient_name"] = pending.get("name")
+    sess["patient_mobile"] = pending.get("mobile")
+    sess["patient_id"] = pending.get("pid")
+
+    sess["mistakes"] = 0
+    sess["appt_ref"] = sess.get("appt_ref") or _make_reference("SSH")
+
+    _set_confirm_expiry(sess)
+
+    sess["state"] = STATE_BOOK_CONFIRM
+    sess["last_step"] = STATE_BOOK_CONFIRM
+    out = _confirmation(sess, lang)
+    return _respond(sess, out)
+
+
+def _turn_book_confirm(sess: Dict[str, Any], lang: str, raw: str, low: str, message_text: str) -> EngineResult:
+    if _confirm_expired(sess):
+        sess["confirm_expires_at"] = None
+        msg = _reply("summary_expired", lang)
+        sess["state"] = STATE_BOOK_SLOT
+        sess["last_step"] = STATE_BOOK_SLOT
+        out = msg + "\n\n" + _slot_prompt(lang, sess.get("date") or "")
+        return _respond(sess, out)
+
+    if not _is_digit_choice(raw):
+        msg = _reply("invalid_confirm", lang)
+        out = _soft_invalid(sess, lang, msg) + "\n\n" + _confirmation(sess, lang)
+        return _respond(sess, out)
+
+    c = _to_int(raw)
+
+    # 1) send to reception
+    if c == 1:
+        sess["status"] = STATUS_COMPLETED
+        sess["state"] = STATE_CLOSED
+        sess["last_step"] = STATE_CLOSED
+        sess["confirm_expires_at"] = None
+
+        ref = sess.get("appt_ref") or _make_reference("SSH")
+        sess["appt_ref"] = ref
+
+        if lang == "ar":
+            out = (
+                "تم استلام طلب الحجز ✅\n"
+                f"📌 رقم المرجع: *{ref}*\n"
+                "سيقوم موظف الاستقبال بتأكيد الموعد خلال ساعات العمل.\n"
+                "يرجى الحضور قبل الموعد بـ 15 دقيقة.\n\n"
+                f"{CLINIC_TIMINGS_AR}\n"
+                f"🚑 الطوارئ: {EMERGENCY_NUMBER}\n"
+                "للتحدث مع موظف الاستقبال: 99\n\n"
+                "للعودة للقائمة الرئيسية اكتب 0."
+            )
+        else:
+            out = (
+                "Booking request received ✅\n"
+                f"📌 Reference: *{ref}*\n"
+                "Reception will confirm your appointment during working hours.\n"
+                "Please arrive 15 minutes early.\n\n"
+                f"{CLINIC_TIMINGS_EN}\n"
+                f"🚑 Emergency: {EMERGENCY_NUMBER}\n"
+                "To speak to Reception: 99\n\n"
+                "Reply 0 for the main menu."
+            )
+
+        actions = [{
+            "type": "CREATE_APPOINTMENT_REQUEST",
+            "payload": {
+                "intent": "BOOK",
+                "status": "PENDING",
+                "dept_key": sess.get("dept_key"),
+                "dept_label": sess.get("dept_label"),
+                "doctor_key": sess.get("doctor_key"),
+                "doctor_label": sess.get("doctor_label"),
+                "appt_date": sess.get("date"),
+                "appt_time": sess.get("slot"),
+                "patient_name": sess.get("patient_name"),
+                "patient_mobile": sess.get("patient_mobile"),
+                "patient_id": sess.get("patient_id"),
+                "notes": f"appt_ref={ref}",
+            },
+        }]
+
+        return _respond(sess, out, actions)
+
+    # ✅ 2) modify date/slot (keep dept + doctor)
+    if c == 2:
+        sess["confirm_expires_at"] = None
+        sess["date"] = None
+        sess["slot"] = None
+        sess["mistakes"] = 0
+        sess["state"] = STATE_BOOK_DATE
+        sess["last_step"] = STATE_BOOK_DATE
+        out = _reply("new_date", lang)
+        out += _date_prompt(lang)
+        return _respond(sess, out)
+
+    # 3) cancel request
+    if c == 3:
+        sess["state"] = STATE_MENU
+        sess["last_step"] = STATE_MENU
+        sess["mistakes"] = 0
+        sess["confirm_expires_at"] = None
+        out = _reply("request_cancelled", lang)
+        out += _main_menu(lang)
+        return _respond(sess, out)
+
+    msg = _reply("invalid_confirm", lang)
+    out = _soft_invalid(sess, lang, msg) + "\n\n" + _confirmation(sess, lang)
+    return _respond(sess, out)
+
+
+# state -> turn handler; states without an entry (LANG_SELECT, ESCALATION, CLOSED, ...) fall back to the menu
+_STATE_HANDLERS: Dict[str, Callable[..., EngineResult]] = {
+    STATE_MENU: _turn_menu,
+    STATE_RESCHEDULE_LOOKUP: _turn_reschedule_lookup,
+    STATE_CANCEL_LOOKUP: _turn_cancel_lookup,
+    STATE_BOOK_DEPT: _turn_book_dept,
+    STATE_BOOK_DOCTOR: _turn_book_doctor,
+    STATE_BOOK_DATE: _turn_book_date,
+    STATE_BOOK_SLOT: _turn_book_slot,
+    STATE_BOOK_PATIENT: _turn_book_patient,
+    STATE_BOOK_CONFIRM: _turn_book_confirm,
+}
+
+
 def handle_turn(
     user_id: str,
     message_text: str,
@@ -713,7 +1255,7 @@ def handle_turn(
     sess["user_id"] = user_id
 
     raw = _norm(message_text)
-    low = _low(message_text)
+    low = _normalize_digits(raw.lower())  # == _low(message_text), without re-cleaning
 
     # Respect existing session language
     lang = _lang(sess.get("language") or language or "ar")
@@ -740,8 +1282,7 @@ def handle_turn(
             sess["dept_key"] = dept0
             sess["dept_label"] = _dept_label(dept0, lang)
             out = _doctor_info_reply(sess, lang, dept0)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
+            return _respond(sess, out)
 
         if intent0 == "BOOK" and dept0 and dept0 in DOCTORS_BY_DEPT_KEY:
             _reset_flow_fields(sess)
@@ -769,21 +1310,22 @@ def handle_turn(
                     + "\n\nPlease choose a doctor:\n\n"
                 )
             out += _doctor_prompt(lang, dept0)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
+            return _respond(sess, out)
 
         sess["has_greeted"] = True
         sess["state"] = STATE_MENU
         sess["last_step"] = STATE_MENU
         out = _greeting_menu_ar(sess) if lang == "ar" else _greeting_menu_en(sess)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
+        return _respond(sess, out)
 
     prev_last = sess.get("last_user_ts")
+    prev_epoch = sess.get("last_user_epoch")
+    # ISO kept for the inactivity reminder SQL (::timestamptz); epoch for the expiry math
     sess["last_user_ts"] = _utcnow_iso()
+    sess["last_user_epoch"] = time.time()
 
     # Session expiry: go to menu (privacy already sent once; do not resend)
-    if prev_last and _session_expired_from(prev_last) and sess.get("state") != STATE_ESCALATION:
+    if prev_last and _session_expired_from(prev_last, prev_epoch) and sess.get("state") != STATE_ESCALATION:
         keep_lang = _lang(sess.get("language") or lang)
         locked = bool(sess.get("language_locked"))
 
@@ -796,516 +1338,37 @@ def handle_turn(
         sess["last_step"] = STATE_MENU
 
         out = _main_menu(keep_lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
+        return _respond(sess, out)
 
     # 0 = show menu
-    if low in {"0", "٠"}:
+    if low in _MENU_KEYS:
         sess["state"] = STATE_MENU
         sess["last_step"] = STATE_MENU
         out = _main_menu(lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
+        return _respond(sess, out)
 
     # Reception shortcut
     if low == "99":
         sess["state"] = STATE_ESCALATION
         sess["last_step"] = STATE_ESCALATION
         sess["escalation_flag"] = True
-        out = (
-            "تم تحويلكم للتحدث مع موظف الاستقبال ✅ الرجاء الانتظار... (للعودة للقائمة اكتب 0)"
-            if lang == "ar" else
-            "Connecting you to speak to Reception ✅ Please wait... (Reply 0 for menu)"
-        )
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [{"type": "ESCALATE", "reason": "user_requested_reception"}])
-
-    if _is_thanks(raw):
-        out = (
-            "العفو ✅ إذا احتجت أي شيء آخر اكتب 0 لعرض القائمة."
-            if lang == "ar" else
-            "You’re welcome ✅ If you need anything else, reply 0 for the menu."
-        )
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    # MAIN MENU routing
-    if sess.get("state") == STATE_MENU:
-        if not raw:
-            out = _main_menu(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        # If user is in Specialty Inquiry context and presses 1 => book directly for same dept
-        if _is_digit_choice(raw) and sess.get("intent") == "SPECIALTY_INQUIRY" and sess.get("dept_key"):
-            c = _to_int(raw)
-            dept_key = sess.get("dept_key")
-            if c == 1 and dept_key in DOCTORS_BY_DEPT_KEY:
-                _reset_flow_fields(sess)
-                sess["intent"] = "BOOK"
-                sess["dept_key"] = dept_key
-                sess["dept_label"] = _dept_label(dept_key, lang)
-                sess["state"] = STATE_BOOK_DOCTOR
-                sess["last_step"] = STATE_BOOK_DOCTOR
-
-                if lang == "ar":
-                    out = f"تم اختيار تخصص *{sess['dept_label']}* ✅\n\n" + _doctor_prompt(lang, dept_key)
-                else:
-                    out = f"Selected specialty: *{sess['dept_label']}* ✅\n\n" + _doctor_prompt(lang, dept_key)
-
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-        if _is_digit_choice(raw):
-            choice = _to_int(raw)
-
-            if choice == 1:
-                _reset_flow_fields(sess)
-                sess["intent"] = "BOOK"
-                sess["state"] = STATE_BOOK_DEPT
-                sess["last_step"] = STATE_BOOK_DEPT
-                out = _dept_prompt(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 2:
-                _reset_flow_fields(sess)
-                sess["intent"] = "RESCHEDULE"
-                sess["state"] = STATE_RESCHEDULE_LOOKUP
-                sess["last_step"] = STATE_RESCHEDULE_LOOKUP
-                out = (
-                    "يرجى إدخال رقم المرجع أو رقم الجوال المسجل." if lang == "ar"
-                    else "Please enter your reference number or registered mobile."
-                ) + _footer(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 3:
-                _reset_flow_fields(sess)
-                sess["intent"] = "CANCEL"
-                sess["state"] = STATE_CANCEL_LOOKUP
-                sess["last_step"] = STATE_CANCEL_LOOKUP
-                out = (
-                    "يرجى إدخال رقم المرجع أو رقم الجوال المسجل لإتمام الإلغاء." if lang == "ar"
-                    else "Please enter your reference number or registered mobile to cancel."
-                ) + _footer(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 4:
-                _reset_flow_fields(sess)
-                sess["intent"] = "SPECIALTY_INQUIRY"
-                sess["state"] = STATE_BOOK_DEPT
-                sess["last_step"] = STATE_BOOK_DEPT
-                out = _dept_prompt(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 5:
-                out = _timings_text(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 6:
-                out = _insurance_text(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 7:
-                out = _location_text(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 8:
-                out = _contact_text(lang)
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [])
-
-            if choice == 99:
-                sess["state"] = STATE_ESCALATION
-                sess["last_step"] = STATE_ESCALATION
-                sess["escalation_flag"] = True
-                out = (
-                    "تم تحويلكم للتحدث مع موظف الاستقبال ✅ الرجاء الانتظار... (للعودة للقائمة اكتب 0)"
-                    if lang == "ar" else
-                    "Connecting you to speak to Reception ✅ Please wait... (Reply 0 for menu)"
-                )
-                _set_bot(sess, out)
-                return EngineResult(out, sess, [{"type": "ESCALATE", "reason": "user_requested_reception"}])
+        out = _reply("reception", lang)
+        return _respond(sess, out, [{"type": "ESCALATE", "reason": "user_requested_reception"}])
 
-            msg = ("يرجى اختيار رقم صحيح من القائمة." if lang == "ar" else "Please choose a valid menu number.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _main_menu(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
+    if _is_thanks_low(low):
+        out = _reply("thanks", lang)
+        return _respond(sess, out)
 
-        # Free text in menu: try intent + dept
-        intent = _detect_intent(message_text)
-        dept_key = _detect_dept_key(message_text)
-
-        if intent == "SPECIALTY_INQUIRY" and dept_key:
-            sess["intent"] = "SPECIALTY_INQUIRY"
-            sess["dept_key"] = dept_key
-            sess["dept_label"] = _dept_label(dept_key, lang)
-            out = _doctor_info_reply(sess, lang, dept_key)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        if intent == "BOOK" and dept_key and dept_key in DOCTORS_BY_DEPT_KEY:
-            _reset_flow_fields(sess)
-            sess["intent"] = "BOOK"
-            sess["dept_key"] = dept_key
-            sess["dept_label"] = _dept_label(dept_key, lang)
-            sess["state"] = STATE_BOOK_DOCTOR
-            sess["last_step"] = STATE_BOOK_DOCTOR
-
-            if lang == "ar":
-                out = f"تم اختيار تخصص *{sess['dept_label']}* ✅\n\n" + _doctor_prompt(lang, dept_key)
-            else:
-                out = f"Selected specialty: *{sess['dept_label']}* ✅\n\n" + _doctor_prompt(lang, dept_key)
-
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        out = _main_menu(lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    # ✅ RESCHEDULE LOOKUP
-    if sess.get("state") == STATE_RESCHEDULE_LOOKUP:
-        ref_or_mobile = raw.strip()
-        is_ref = _looks_like_reference(ref_or_mobile)
-        is_mobile = _valid_mobile(ref_or_mobile)
-
-        if not (is_ref or is_mobile):
-            msg = (
-                "المدخل غير صحيح. أدخل رقم المرجع (مثل SSH-260301-1234) أو رقم الجوال."
-                if lang == "ar"
-                else "Invalid input. Enter your reference (e.g., SSH-260301-1234) or your mobile number."
-            )
-            out = _soft_invalid(sess, lang, msg) + _footer(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        out = (
-            "لم نعثر على حجز مرتبط بهذه البيانات.\nيرجى التأكد من الرقم والمحاولة مرة أخرى أو إدخال رقم المرجع.\n"
-            if lang == "ar"
-            else "We could not find any booking linked to this information.\nPlease check and try again, or enter your booking reference.\n"
-        ) + _footer(lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    # ✅ CANCEL LOOKUP
-    if sess.get("state") == STATE_CANCEL_LOOKUP:
-        ref_or_mobile = raw.strip()
-        is_ref = _looks_like_reference(ref_or_mobile)
-        is_mobile = _valid_mobile(ref_or_mobile)
-
-        if not (is_ref or is_mobile):
-            msg = ("المدخل غير صحيح. أدخل رقم المرجع أو رقم الجوال." if lang == "ar"
-                   else "Invalid input. Enter your reference or your mobile number.")
-            out = _soft_invalid(sess, lang, msg) + _footer(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        out = (
-            "لم نعثر على موعد مرتبط بهذه البيانات لإلغائه.\nيرجى التأكد من الرقم والمحاولة مرة أخرى أو إدخال رقم المرجع.\n"
-            if lang == "ar"
-            else "We could not find any appointment linked to this information to cancel.\nPlease check and try again, or enter your reference.\n"
-        ) + _footer(lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    # BOOKING FLOWS
-    if sess.get("state") == STATE_BOOK_DEPT:
-        # ✅ accept 21 -> 12
-        if _is_digit_choice(raw) and _to_int(raw) == 21 and len(DEPTS) >= 12:
-            raw = "12"
-            low = "12"
-
-        # ✅ accept 01 as 10 (physio)
-        if _is_digit_choice(raw) and _to_int(raw) == 1 and raw.strip().startswith("0") and len(DEPTS) >= 10:
-            raw = "10"
-            low = "10"
-
-        idx = _to_int(raw, -1) - 1 if _is_digit_choice(raw) else -1
-        dept_key = None
-        dept_label = None
-
-        if 0 <= idx < len(DEPTS):
-            dept_key = DEPTS[idx]["key"]
-            dept_label = DEPTS[idx]["ar"] if lang == "ar" else DEPTS[idx]["en"]
-        else:
-            k2 = _detect_dept_key(message_text)
-            if k2:
-                dept_key = k2
-                dept_label = _dept_label(k2, lang)
-
-        if not dept_key:
-            msg = ("يرجى اختيار تخصص صحيح." if lang == "ar" else "Please choose a valid specialty.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _dept_prompt(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        sess["dept_key"] = dept_key
-        sess["dept_label"] = dept_label
-        sess["mistakes"] = 0
-
-        if sess.get("intent") == "SPECIALTY_INQUIRY":
-            sess["state"] = STATE_MENU
-            sess["last_step"] = STATE_MENU
-            out = _doctor_info_reply(sess, lang, dept_key)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        sess["state"] = STATE_BOOK_DOCTOR
-        sess["last_step"] = STATE_BOOK_DOCTOR
-        out = _doctor_prompt(lang, dept_key)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    if sess.get("state") == STATE_BOOK_DOCTOR:
-        docs = DOCTORS_BY_DEPT_KEY.get(sess.get("dept_key") or "", [])
-        idx = _to_int(raw, -1) - 1 if _is_digit_choice(raw) else -1
-
-        chosen_label = None
-        chosen_key = None
-
-        if 0 <= idx < len(docs):
-            chosen_key = docs[idx].get("key")
-            chosen_label = docs[idx]["ar"] if lang == "ar" else docs[idx]["en"]
-        else:
-            for doc in docs:
-                if _low(doc["ar"]) in low or _low(doc["en"]) in low:
-                    chosen_key = doc.get("key")
-                    chosen_label = doc["ar"] if lang == "ar" else doc["en"]
-                    break
-
-        if not chosen_label:
-            msg = ("يرجى اختيار طبيب صحيح." if lang == "ar" else "Please choose a valid doctor.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _doctor_prompt(lang, sess.get("dept_key") or "")
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        sess["doctor_key"] = chosen_key
-        sess["doctor_label"] = chosen_label
-        sess["mistakes"] = 0
-        sess["state"] = STATE_BOOK_DATE
-        sess["last_step"] = STATE_BOOK_DATE
-        out = _date_prompt(lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    if sess.get("state") == STATE_BOOK_DATE:
-        norm_ymd, err = _parse_date_any(message_text)
-        if not norm_ymd:
-            if lang == "ar":
-                msg = (
-                    "صيغة التاريخ غير صحيحة. مثال: 2026-03-10 أو 10-03-2026 أو 10/03/2026"
-                    if err == "format" else
-                    "التاريخ غير صالح. يرجى إدخال تاريخ صحيح."
-                )
-            else:
-                msg = (
-                    "Date format is invalid. Example: 2026-03-10 or 10-03-2026 or 10/03/2026"
-                    if err == "format" else
-                    "That date is not valid. Please enter a valid date."
-                )
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _date_prompt(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        if _is_past_date(norm_ymd):
-            msg = ("لا يمكن اختيار تاريخ سابق. يرجى اختيار تاريخ قادم." if lang == "ar"
-                   else "Past dates are not allowed. Please choose a future date.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _date_prompt(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        sess["date"] = norm_ymd
-        sess["mistakes"] = 0
-        sess["state"] = STATE_BOOK_SLOT
-        sess["last_step"] = STATE_BOOK_SLOT
-        out = _slot_prompt(lang, norm_ymd)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    if sess.get("state") == STATE_BOOK_SLOT:
-        idx = _to_int(raw, -1) - 1 if _is_digit_choice(raw) else -1
-        if not (0 <= idx < len(SLOTS)):
-            msg = ("يرجى اختيار رقم فترة صحيح." if lang == "ar" else "Please choose a valid slot number.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _slot_prompt(lang, sess.get("date") or "")
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        sess["slot"] = SLOTS[idx]
-        sess["mistakes"] = 0
-        sess["state"] = STATE_BOOK_PATIENT
-        sess["last_step"] = STATE_BOOK_PATIENT
-        out = _patient_prompt_full(lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    # ✅ THIS BLOCK EXISTS (patient capture) — your repo version likely missed it
-    if sess.get("state") == STATE_BOOK_PATIENT:
-        pending = sess.get("pending_patient") or {"name": None, "mobile": None, "pid": None}
-        if not isinstance(pending, dict):
-            pending = {"name": None, "mobile": None, "pid": None}
-
-        name, mobile, pid = _extract_name_mobile_id(message_text)
-
-        if name and not pending.get("name"):
-            pending["name"] = name
-        if mobile and not pending.get("mobile"):
-            pending["mobile"] = mobile
-        if pid and not pending.get("pid"):
-            pending["pid"] = pid
-
-        sess["pending_patient"] = pending
-
-        if pending.get("name") and not pending.get("mobile"):
-            out = _patient_ask_mobile_only(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        if pending.get("mobile") and not pending.get("name"):
-            out = _patient_ask_name_only(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        if not pending.get("name") or not _valid_mobile(pending.get("mobile")):
-            msg = ("فضلاً أرسل الاسم الكامل ورقم جوال صحيح." if lang == "ar"
-                   else "Please send full name and a valid mobile number.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _patient_prompt_full(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        sess["patient_name"] = pending.get("name")
-        sess["patient_mobile"] = pending.get("mobile")
-        sess["patient_id"] = pending.get("pid")
-
-        sess["mistakes"] = 0
-        sess["appt_ref"] = sess.get("appt_ref") or _make_reference("SSH")
-
-        _set_confirm_expiry(sess)
-
-        sess["state"] = STATE_BOOK_CONFIRM
-        sess["last_step"] = STATE_BOOK_CONFIRM
-        out = _confirmation(sess, lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
-
-    if sess.get("state") == STATE_BOOK_CONFIRM:
-        if _confirm_expired(sess):
-            sess["confirm_expires_at"] = None
-            msg = (
-                "⏳ انتهت صلاحية ملخص الحجز. حفاظًا على الدقة، يرجى اختيار الفترة مرة أخرى."
-                if lang == "ar" else
-                "⏳ This booking summary has expired. To ensure accuracy, please select the slot again."
-            )
-            sess["state"] = STATE_BOOK_SLOT
-            sess["last_step"] = STATE_BOOK_SLOT
-            out = msg + "\n\n" + _slot_prompt(lang, sess.get("date") or "")
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        if not _is_digit_choice(raw):
-            msg = ("يرجى اختيار 1 أو 2 أو 3." if lang == "ar" else "Please choose 1, 2, or 3.")
-            out = _soft_invalid(sess, lang, msg) + "\n\n" + _confirmation(sess, lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        c = _to_int(raw)
-
-        # 1) send to reception
-        if c == 1:
-            sess["status"] = STATUS_COMPLETED
-            sess["state"] = STATE_CLOSED
-            sess["last_step"] = STATE_CLOSED
-            sess["confirm_expires_at"] = None
-
-            ref = sess.get("appt_ref") or _make_reference("SSH")
-            sess["appt_ref"] = ref
-
-            if lang == "ar":
-                out = (
-                    "تم استلام طلب الحجز ✅\n"
-                    f"📌 رقم المرجع: *{ref}*\n"
-                    "سيقوم موظف الاستقبال بتأكيد الموعد خلال ساعات العمل.\n"
-                    "يرجى الحضور قبل الموعد بـ 15 دقيقة.\n\n"
-                    f"{CLINIC_TIMINGS_AR}\n"
-                    f"🚑 الطوارئ: {EMERGENCY_NUMBER}\n"
-                    "للتحدث مع موظف الاستقبال: 99\n\n"
-                    "للعودة للقائمة الرئيسية اكتب 0."
-                )
-            else:
-                out = (
-                    "Booking request received ✅\n"
-                    f"📌 Reference: *{ref}*\n"
-                    "Reception will confirm your appointment during working hours.\n"
-                    "Please arrive 15 minutes early.\n\n"
-                    f"{CLINIC_TIMINGS_EN}\n"
-                    f"🚑 Emergency: {EMERGENCY_NUMBER}\n"
-                    "To speak to Reception: 99\n\n"
-                    "Reply 0 for the main menu."
-                )
-
-            actions = [{
-                "type": "CREATE_APPOINTMENT_REQUEST",
-                "payload": {
-                    "intent": "BOOK",
-                    "status": "PENDING",
-                    "dept_key": sess.get("dept_key"),
-                    "dept_label": sess.get("dept_label"),
-                    "doctor_key": sess.get("doctor_key"),
-                    "doctor_label": sess.get("doctor_label"),
-                    "appt_date": sess.get("date"),
-                    "appt_time": sess.get("slot"),
-                    "patient_name": sess.get("patient_name"),
-                    "patient_mobile": sess.get("patient_mobile"),
-                    "patient_id": sess.get("patient_id"),
-                    "notes": f"appt_ref={ref}",
-                },
-            }]
-
-            _set_bot(sess, out)
-            return EngineResult(out, sess, actions)
-
-        # ✅ 2) modify date/slot (keep dept + doctor)
-        if c == 2:
-            sess["confirm_expires_at"] = None
-            sess["date"] = None
-            sess["slot"] = None
-            sess["mistakes"] = 0
-            sess["state"] = STATE_BOOK_DATE
-            sess["last_step"] = STATE_BOOK_DATE
-            out = ("تمام. اختر تاريخ جديد للموعد.\n\n" if lang == "ar" else "Okay. Please choose a new appointment date.\n\n")
-            out += _date_prompt(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        # 3) cancel request
-        if c == 3:
-            sess["state"] = STATE_MENU
-            sess["last_step"] = STATE_MENU
-            sess["mistakes"] = 0
-            sess["confirm_expires_at"] = None
-            out = ("تم إلغاء الطلب. للمتابعة اختر من القائمة.\n\n" if lang == "ar"
-                   else "Request cancelled. Please choose from the menu.\n\n")
-            out += _main_menu(lang)
-            _set_bot(sess, out)
-            return EngineResult(out, sess, [])
-
-        msg = ("يرجى اختيار 1 أو 2 أو 3." if lang == "ar" else "Please choose 1, 2, or 3.")
-        out = _soft_invalid(sess, lang, msg) + "\n\n" + _confirmation(sess, lang)
-        _set_bot(sess, out)
-        return EngineResult(out, sess, [])
+    # Per-state flow: one dict lookup instead of an if-ladder over every state
+    handler = _STATE_HANDLERS.get(sess.get("state"))
+    if handler is not None:
+        return handler(sess, lang, raw, low, message_text)
 
     # Fallback
     sess["state"] = STATE_MENU
     sess["last_step"] = STATE_MENU
     out = _main_menu(lang)
-    _set_bot(sess, out)
-    return EngineResult(out, sess, [])
+    return _respond(sess, out)
 
 
 def run_engine(
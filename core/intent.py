@@ -1,39 +1,53 @@
 # core/intent.py
+import re
+
+# Exact (whole-message) English intents → one dict lookup
+_EXACT_EN = {
+    "hi": "GREETING",
+    "hello": "GREETING",
+    "hey": "GREETING",
+    "thx": "THANKS",
+    "thanks": "THANKS",
+}
+
+# Substring keywords per language, in precedence order (first intent that matches wins)
+_KEYWORDS = {
+    "ar": (
+        ("GREETING", ["السلام", "مرحبا", "اهلا", "أهلاً", "هلا"]),
+        ("THANKS", ["شكرا", "شكرًا", "جزاك"]),
+        ("REFUND", ["استرجاع", "ارجاع", "إرجاع", "تعويض", "استرداد", "refund", "return"]),
+        ("ORDER_STATUS", ["طلب", "طلبي", "توصيل", "الشحنة", "تتبع", "متأخر", "تأخير"]),
+    ),
+    "en": (
+        ("THANKS", ["thank"]),
+        ("REFUND", ["refund", "return", "replacement", "exchange"]),
+        ("ORDER_STATUS", ["order", "delivery", "shipment", "tracking", "delayed", "late"]),
+    ),
+}
+
+# One compiled alternation per (language, intent): a single C-level scan each
+_INTENT_RES = {
+    lang: tuple((label, re.compile("|".join(re.escape(k) for k in words))) for label, words in groups)
+    for lang, groups in _KEYWORDS.items()
+}
+
 
 def detect_intent(text: str, language: str = "en") -> str:
     t = (text or "").strip().lower()
     if not t:
         return "UNCLEAR"
 
-    if language == "ar":
-        if any(k in t for k in ["السلام", "مرحبا", "اهلا", "أهلاً", "هلا"]):
-            return "GREETING"
-    else:
-        if t in {"hi", "hello", "hey"}:
-            return "GREETING"
-
-    if language == "ar":
-        if any(k in t for k in ["شكرا", "شكرًا", "جزاك"]):
-            return "THANKS"
-    else:
-        if "thank" in t or t in {"thx", "thanks"}:
-            return "THANKS"
-
-    if language == "ar":
-        if any(k in t for k in ["استرجاع", "ارجاع", "إرجاع", "تعويض", "استرداد", "refund", "return"]):
-            return "REFUND"
-    else:
-        if any(k in t for k in ["refund", "return", "replacement", "exchange"]):
-            return "REFUND"
-
-    if language == "ar":
-        if any(k in t for k in ["طلب", "طلبي", "توصيل", "الشحنة", "تتبع", "متأخر", "تأخير"]):
-            return "ORDER_STATUS"
-    else:
-        if any(k in t for k in ["order", "delivery", "shipment", "tracking", "delayed", "late"]):
-            return "ORDER_STATUS"
+    lang = "ar" if language == "ar" else "en"
+    if lang == "en":
+        exact = _EXACT_EN.get(t)
+        if exact:
+            return exact
+
+    for label, rx in _INTENT_RES[lang]:
+        if rx.search(t):
+            return label
 
     if len(t) < 4:
         return "UNCLEAR"
 
-    return "GENERAL"
\ No newline at end of file
+    return "GENERAL"
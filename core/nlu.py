@@ -2,16 +2,22 @@
 from __future__ import annotations
 import re
 
+from core.text_match import keyword_re
+
 
 # =========================================================
 # LANGUAGE DETECTION
 # =========================================================
 
+_ARABIC_CHAR_RE = re.compile(r"[\u0600-\u06FF]")
+
+
 def detect_language(text: str) -> str:
     if not text:
         return "en"
 
-    arabic = sum(1 for c in text if "\u0600" <= c <= "\u06FF")
+    # Count Arabic-block chars in C (findall) rather than a per-char Python loop
+    arabic = len(_ARABIC_CHAR_RE.findall(text))
     ratio = arabic / max(len(text), 1)
 
     return "ar" if ratio > 0.20 else "en"
@@ -21,24 +27,20 @@ def detect_language(text: str) -> str:
 # NORMALIZATION (VERY IMPORTANT FOR GCC MIXED TEXT)
 # =========================================================
 
+_NORMALIZE_TABLE = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+})
+
+
 def normalize(text: str) -> str:
     if not text:
         return ""
 
-    text = text.lower()
-
-    replacements = {
-        "أ": "ا",
-        "إ": "ا",
-        "آ": "ا",
-        "ة": "ه",
-        "ى": "ي",
-    }
-
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-
-    return text
+    return text.lower().translate(_NORMALIZE_TABLE)
 
 
 # =========================================================
@@ -129,31 +131,40 @@ def contains(text: str, keywords: list[str]) -> bool:
     return any(k in text for k in keywords)
 
 
+_THANKS_RE = keyword_re(THANKS)
+_RECEPTION_RE = keyword_re(RECEPTION)
+_EMERGENCY_RE = keyword_re(EMERGENCY)
+_CANCEL_RE = keyword_re(CANCEL)
+_RESCHEDULE_RE = keyword_re(RESCHEDULE)
+_BOOKING_RE = keyword_re(BOOKING)
+_SPECIALTY_RES = [(dept, keyword_re(words)) for dept, words in SPECIALTIES.items()]
+
+
 def detect_intent(text: str):
 
     t = normalize(text)
 
-    if contains(t, THANKS):
+    if _THANKS_RE.search(t):
         return "THANKS", None
 
-    if contains(t, RECEPTION):
+    if _RECEPTION_RE.search(t):
         return "RECEPTION", None
 
-    if contains(t, EMERGENCY):
+    if _EMERGENCY_RE.search(t):
         return "EMERGENCY", None
 
-    if contains(t, CANCEL):
+    if _CANCEL_RE.search(t):
         return "CANCEL", None
 
-    if contains(t, RESCHEDULE):
+    if _RESCHEDULE_RE.search(t):
         return "RESCHEDULE", None
 
     # specialty detection
-    for dept, words in SPECIALTIES.items():
-        if contains(t, words):
+    for dept, rx in _SPECIALTY_RES:
+        if rx.search(t):
             return "SPECIALTY", dept
 
-    if contains(t, BOOKING):
+    if _BOOKING_RE.search(t):
         return "BOOK", None
 
     return "UNKNOWN", None
\ No newline at end of file
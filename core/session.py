@@ -1,12 +1,25 @@
 import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Optional
+
 from core.state import ConversationState
 
+
+@dataclass(slots=True)
 class Session:
-    def __init__(self):
-        self.state = ConversationState.START
-        self.intent = None
-        self.language = "en"
-        self.last_seen = time.time()
-        self.waiting_since = None
-        self.verified = False
-        self.closed = False
+    # Fixed attribute set → __slots__, no per-session __dict__
+    state: ConversationState = ConversationState.START
+    intent: Optional[str] = None
+    language: str = "en"
+    last_seen: float = field(default_factory=time.time)
+    waiting_since: Optional[float] = None
+    verified: bool = False
+    closed: bool = False
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in names})
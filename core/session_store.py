@@ -1,8 +1,25 @@
+import os
+
+from cachetools import TTLCache
+
+from core.session import Session
+
+# Bounded, self-expiring working set: idle users drop out instead of accumulating forever
+SESSION_MAX = int(os.getenv("WA_SESSION_MAX", "100000"))
+SESSION_TTL_SECONDS = int(os.getenv("WA_SESSION_TTL_SECONDS", "86400"))
+
+
 class SessionStore:
-    def __init__(self):
-        self.sessions = {}
+    def __init__(self, maxsize=SESSION_MAX, ttl=SESSION_TTL_SECONDS):
+        self.sessions = TTLCache(maxsize=maxsize, ttl=ttl)
 
     def get(self, user_id):
-        if user_id not in self.sessions:
-            self.sessions[user_id] = Session()
-        return self.sessions[user_id]
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = Session()
+        # (Re)insert so the TTL slides with activity
+        self.sessions[user_id] = session
+        return session
+
+    def discard(self, user_id):
+        self.sessions.pop(user_id, None)
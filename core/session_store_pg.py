@@ -1,6 +1,7 @@
 # core/session_store_pg.py
 from __future__ import annotations
 
+import os
 from typing import Any, Dict, Optional
 
 from sqlalchemy import text, bindparam
@@ -9,6 +10,10 @@ from sqlalchemy.dialects.postgresql import JSONB
 
 TABLE_NAME = "sessions"
 
+# Sessions idle longer than this are purged by jobs/inactivity_reminder_worker.py,
+# only when WA_SESSION_SWEEP_SECONDS > 0 (off by default)
+SESSION_TTL_SECONDS = int(os.getenv("WA_SESSION_TTL_SECONDS", "86400"))
+
 
 def _norm_tenant(tenant_id: Optional[str]) -> str:
     t = (tenant_id or "default").strip()
@@ -28,6 +33,7 @@ async def ensure_sessions_table(db: AsyncSession) -> None:
         );
         """)
     )
+    await db.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_updated_at ON {TABLE_NAME}(updated_at);"))
     await db.commit()
 
 
@@ -92,4 +98,24 @@ async def upsert_session(
         stmt,
         {"tenant_id": tenant, "user_id": user_id, "session_json": session},
     )
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+
+
+async def purge_stale_sessions(
+    db: AsyncSession,
+    *,
+    idle_seconds: int = SESSION_TTL_SECONDS,
+) -> int:
+    """
+    Deletes sessions not updated for idle_seconds (all tenants).
+    Returns the number of rows removed.
+    """
+    res = await db.execute(
+        text(f"""
+        DELETE FROM {TABLE_NAME}
+        WHERE updated_at < NOW() - make_interval(secs => :idle_seconds);
+        """),
+        {"idle_seconds": int(idle_seconds)},
+    )
+    await db.commit()
+    return int(res.rowcount or 0)
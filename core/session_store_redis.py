@@ -0,0 +1,418 @@
+# core/session_store_redis.py
+# Redis-backed session store (opt-in: WA_SESSION_BACKEND=redis)
+#
+# Same call shape as core/session_store_pg.py so the controller can swap backends.
+# Each session is a Redis hash  sess:{tenant_id}:{user_id}  (one JSON-encoded value
+# per session key) with a sliding TTL, so idle sessions expire on their own.
+#
+# The inactivity reminder worker sweeps these hashes with claim_inactive_sessions()
+# (SCAN + pipelined HMGET) when WA_SESSION_BACKEND=redis.
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+WA_REDIS_URL = (os.getenv("WA_REDIS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379/0").strip()
+SESSION_TTL_SECONDS = int(os.getenv("WA_SESSION_TTL_SECONDS", "86400"))
+KEY_PREFIX = "sess"
+LOCK_PREFIX = "lock"
+LOCK_TTL_SECONDS = int(os.getenv("WA_SESSION_LOCK_TTL_SECONDS", "30"))
+LOCK_WAIT_SECONDS = float(os.getenv("WA_SESSION_LOCK_WAIT_SECONDS", "5"))
+
+# Optional per-worker read cache (0 = off). Only safe while one worker owns a user's
+# traffic for the TTL (sticky routing / single worker); not for serverless or fan-out.
+SESSION_CACHE_SECONDS = float(os.getenv("WA_SESSION_CACHE_SECONDS", "0"))
+SESSION_CACHE_MAX = int(os.getenv("WA_SESSION_CACHE_MAX", "10000"))
+# key -> encoded hash fields (decoded per read, so callers never share mutable values)
+_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=SESSION_CACHE_MAX, ttl=SESSION_CACHE_SECONDS) if SESSION_CACHE_SECONDS > 0 else None
+)
+
+# Delete the lock only if we still own it (it may have expired and been re-taken)
+_UNLOCK_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Turn commit: replace the session hash (DEL + HSET + EXPIRE) and release our lock in
+# one atomic EVALSHA. KEYS = session hash, lock key; ARGV = ttl, lock token, field1, value1, ...
+_SAVE_UNLOCK_LUA = """
+redis.call("del", KEYS[1])
+redis.call("hset", KEYS[1], unpack(ARGV, 3))
+redis.call("expire", KEYS[1], ARGV[1])
+if redis.call("get", KEYS[2]) == ARGV[2] then
+    return redis.call("del", KEYS[2])
+end
+return 0
+"""
+
+# Lock attempt: SET NX EX and, only when it succeeds, read the session hash in the same
+# round trip (failed retries cost no hash read). ARGV[3] = "0" skips the read (cached).
+# KEYS = lock key, session hash; ARGV = token, lock ttl, read flag
+_LOCK_READ_LUA = """
+if not redis.call("set", KEYS[1], ARGV[1], "NX", "EX", ARGV[2]) then
+    return {0}
+end
+if ARGV[3] == "1" then
+    return {1, redis.call("hgetall", KEYS[2])}
+end
+return {1}
+"""
+
+_pool: Optional[redis.ConnectionPool] = None
+_scripts: Dict[str, Any] = {}  # lua source -> AsyncScript; redis-py reloads it on NOSCRIPT
+
+# (key, raw hash) read in the same round trip that took the session lock;
+# the next get_session() for that key in this task uses it instead of another HGETALL
+_prefetched: contextvars.ContextVar[Optional[Tuple[str, Dict[str, str]]]] = contextvars.ContextVar(
+    "sess_prefetched", default=None
+)
+# (session key, lock key, token) while this task holds the session lock and has not
+# written yet; the turn's upsert_session() then saves and unlocks in one script call
+_held_lock: contextvars.ContextVar[Optional[Tuple[str, str, str]]] = contextvars.ContextVar(
+    "sess_held_lock", default=None
+)
+
+
+def _norm_tenant(tenant_id: Optional[str]) -> str:
+    t = (tenant_id or "default").strip()
+    return t or "default"
+
+
+def _key(tenant_id: str, user_id: str) -> str:
+    return f"{KEY_PREFIX}:{tenant_id}:{user_id}"
+
+
+def _client() -> redis.Redis:
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(WA_REDIS_URL, decode_responses=True)
+    return redis.Redis(connection_pool=_pool)
+
+
+def _script(client: redis.Redis, lua: str):
+    script = _scripts.get(lua)
+    if script is None:
+        script = _scripts[lua] = client.register_script(lua)
+    return script
+
+
+async def open_pool() -> None:
+    """Creates the shared pool at app startup, checks the server is reachable and loads the turn scripts."""
+    client = _client()
+    await client.ping()
+    for lua in (_LOCK_READ_LUA, _SAVE_UNLOCK_LUA):
+        await client.script_load(lua)
+
+
+async def close_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.disconnect()
+
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dumps(value: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str).decode("utf-8")
+        except TypeError:
+            pass  # e.g. non-str dict keys: stdlib json coerces them
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _decode(raw: Dict[str, str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in raw.items():
+        try:
+            out[k] = _loads(v)
+        except Exception:
+            out[k] = v
+    return out
+
+
+async def get_session(
+    db: Any = None,
+    *,
+    user_id: str,
+    tenant_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    tenant = _norm_tenant(tenant_id)
+    key = _key(tenant, user_id)
+    pre = _prefetched.get()
+    if pre is not None and pre[0] == key:
+        _prefetched.set(None)
+        raw = pre[1]
+        fetched = True
+    else:
+        raw = _cache.get(key) if _cache is not None else None
+        fetched = raw is None
+        if fetched:
+            raw = await _client().hgetall(key)
+    if not raw:
+        return None
+    if fetched and _cache is not None:
+        _cache[key] = raw
+    return _decode(raw)
+
+
+async def upsert_session(
+    db: Any = None,
+    *,
+    user_id: str,
+    session: Dict[str, Any],
+    tenant_id: Optional[str] = None,
+) -> None:
+    tenant = _norm_tenant(tenant_id)
+    key = _key(tenant, user_id)
+    mapping = {k: _dumps(v) for k, v in (session or {}).items()}
+    if not mapping:
+        return
+
+    client = _client()
+    held = _held_lock.get()
+    if held is not None and held[0] == key:
+        # Last write of a locked turn: save + release the lock in one atomic round trip
+        args: List[str] = [str(SESSION_TTL_SECONDS), held[2]]
+        for field, value in mapping.items():
+            args += (field, value)
+        await _script(client, _SAVE_UNLOCK_LUA)(keys=[key, held[1]], args=args, client=client)
+        _held_lock.set(None)
+    else:
+        # DEL + HSET + EXPIRE in one MULTI/EXEC: the write replaces the whole session, so
+        # keys the caller dropped don't come back (same as the Postgres JSONB overwrite)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, SESSION_TTL_SECONDS)
+            await pipe.execute()
+
+    if _cache is not None:
+        if session.get("state") == "CLOSED":
+            _cache.pop(key, None)
+        else:
+            _cache[key] = mapping
+
+
+async def clear_tenant_sessions(tenant_id: Optional[str] = None) -> int:
+    tenant = _norm_tenant(tenant_id)
+    if _cache is not None:
+        _cache.clear()
+    client = _client()
+    deleted = 0
+    batch = []
+    async for key in client.scan_iter(match=_key(tenant, "*"), count=500):
+        batch.append(key)
+        if len(batch) >= 500:
+            deleted += await client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += await client.unlink(*batch)
+    return deleted
+
+
+@asynccontextmanager
+async def session_lock(tenant_id: Optional[str], user_id: str) -> AsyncIterator[bool]:
+    """
+    Cross-worker mutex for one user's session turn (SET NX EX + owner-checked delete).
+    Yields whether the lock was acquired; after LOCK_WAIT_SECONDS the turn proceeds
+    without it (same last-write-wins behavior as before) rather than dropping the message.
+    The turn's upsert_session() for this user saves and releases in one script call.
+    """
+    tenant = _norm_tenant(tenant_id)
+    client = _client()
+    key = f"{LOCK_PREFIX}:{tenant}:{user_id}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+
+    sess_key = _key(tenant, user_id)
+    acquired = False
+    _held_lock.set(None)  # never inherit a parent task's lock via a copied context
+    # A cached session is read from the cache by get_session(); only prefetch on a miss
+    prefetch = _cache is None or sess_key not in _cache
+    lock_read = _script(client, _LOCK_READ_LUA)
+    try:
+        while True:
+            # Once the lock is ours, the hash read behind it (same script) is the state
+            # this turn starts from
+            res = await lock_read(
+                keys=[key, sess_key], args=[token, LOCK_TTL_SECONDS, "1" if prefetch else "0"], client=client
+            )
+            if res and int(res[0]) == 1:
+                acquired = True
+                if prefetch:
+                    flat = res[1] if len(res) > 1 else []
+                    _prefetched.set((sess_key, dict(zip(flat[::2], flat[1::2]))))
+                _held_lock.set((sess_key, key, token))
+                break
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.05)
+    except Exception:
+        acquired = False
+
+    try:
+        yield acquired
+    finally:
+        _prefetched.set(None)
+        # Already released if the turn's upsert_session() ran the save+unlock script
+        if acquired and _held_lock.get() is not None:
+            _held_lock.set(None)
+            try:
+                await client.eval(_UNLOCK_LUA, 1, key, token)
+            except Exception:
+                pass  # expires via TTL
+
+
+# -----------------------------
+# Inactivity sweep (jobs/inactivity_reminder_worker.py)
+# -----------------------------
+_SWEEP_FIELDS = (
+    "status", "handoff_active", "escalation_flag", "language",
+    "last_user_epoch", "last_user_ts", "inactivity_nudge_sent", "inactivity_nudged_at",
+)
+SWEEP_SCAN_COUNT = 500
+
+# Claim one idle session: never on a key that expired since the SCAN (HSET would
+# re-create it as a partial hash with no TTL). KEYS = session hash; ARGV = true, nudged_at
+_CLAIM_NUDGE_LUA = """
+if redis.call("exists", KEYS[1]) == 0 then
+    return 0
+end
+if redis.call("hsetnx", KEYS[1], "inactivity_nudge_sent", ARGV[1]) == 0 then
+    return 0
+end
+redis.call("hset", KEYS[1], "inactivity_nudged_at", ARGV[2])
+return 1
+"""
+
+
+def _iso_epoch(value: Any) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def _activity_epoch(fields: Dict[str, Any]) -> Optional[float]:
+    epoch = fields.get("last_user_epoch")
+    if isinstance(epoch, (int, float)):
+        return float(epoch)
+    return _iso_epoch(fields.get("last_user_ts")) if fields.get("last_user_ts") else None
+
+
+async def _scan_sweep_fields(client: redis.Redis) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    # One SCAN cursor; each batch of keys is read with a single pipelined HMGET round trip
+    batch: List[str] = []
+
+    async def _read(keys: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        async with client.pipeline(transaction=False) as pipe:
+            for k in keys:
+                pipe.hmget(k, _SWEEP_FIELDS)
+            rows = await pipe.execute()
+        return [
+            (k, _decode({f: v for f, v in zip(_SWEEP_FIELDS, row) if v is not None}))
+            for k, row in zip(keys, rows)
+        ]
+
+    async for key in client.scan_iter(match=f"{KEY_PREFIX}:*", count=SWEEP_SCAN_COUNT):
+        batch.append(key)
+        if len(batch) >= SWEEP_SCAN_COUNT:
+            for item in await _read(batch):
+                yield item
+            batch = []
+    if batch:
+        for item in await _read(batch):
+            yield item
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    _, tenant, user_id = key.split(":", 2)
+    return tenant, user_id
+
+
+async def reset_nudged_active_sessions() -> int:
+    """
+    Clears the nudge flags of sessions whose user wrote again AFTER the nudge
+    (Redis twin of reset_nudge_when_user_active).
+    """
+    client = _client()
+    stale: List[str] = []
+    async for key, f in _scan_sweep_fields(client):
+        if f.get("inactivity_nudge_sent") is not True:
+            continue
+        nudged = _iso_epoch(f.get("inactivity_nudged_at"))
+        active = _activity_epoch(f)
+        if nudged is not None and active is not None and active > nudged:
+            stale.append(key)
+
+    if stale:
+        async with client.pipeline(transaction=False) as pipe:
+            for key in stale:
+                pipe.hdel(key, "inactivity_nudge_sent", "inactivity_nudged_at")
+            await pipe.execute()
+    return len(stale)
+
+
+async def claim_inactive_sessions(
+    cutoff_epoch: float,
+    nudged_at: str,
+    limit: int = 200,
+) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Claims up to `limit` idle sessions (last user activity <= cutoff_epoch) and marks
+    them nudged. HSETNX on inactivity_nudge_sent is the claim, so two workers never
+    nudge the same user; keys that expired since the scan are skipped. Returns (tenant_id, user_id, swept fields) per claimed session.
+    """
+    client = _client()
+    candidates: List[Tuple[str, Dict[str, Any]]] = []
+    async for key, f in _scan_sweep_fields(client):
+        if (f.get("status") or "ACTIVE") != "ACTIVE":
+            continue
+        if f.get("handoff_active") is True or f.get("escalation_flag") is True:
+            continue
+        if "inactivity_nudge_sent" in f:
+            continue
+        active = _activity_epoch(f)
+        if active is None or active > cutoff_epoch:
+            continue
+        candidates.append((key, f))
+
+    candidates.sort(key=lambda kf: _activity_epoch(kf[1]) or 0.0)
+    candidates = candidates[:limit]
+    if not candidates:
+        return []
+
+    claim = _script(client, _CLAIM_NUDGE_LUA)
+    args = [_dumps(True), _dumps(nudged_at)]
+    async with client.pipeline(transaction=False) as pipe:
+        for key, _ in candidates:
+            await claim(keys=[key], args=args, client=pipe)
+        won = await pipe.execute()
+
+    claimed = [(key, f) for (key, f), ok in zip(candidates, won) if int(ok or 0) == 1]
+    return [(*_split_key(key), f) for key, f in claimed]
+
+
+async def unmark_nudge(tenant_id: Optional[str], user_id: str) -> None:
+    await _client().hdel(_key(_norm_tenant(tenant_id), user_id), "inactivity_nudge_sent", "inactivity_nudged_at")
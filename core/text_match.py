@@ -0,0 +1,14 @@
+# core/text_match.py
+from __future__ import annotations
+
+import re
+from typing import Iterable
+
+
+def keyword_re(words: Iterable[str]) -> "re.Pattern[str]":
+    """
+    One substring alternation: pattern.search(t) == any(w in t for w in words), in a
+    single regex scan. Empty words are skipped, and an empty list never matches.
+    """
+    alts = [re.escape(w) for w in words if w]
+    return re.compile("|".join(alts) if alts else r"(?!)")
@@ -13,6 +13,10 @@ def _utc_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
+# Static part of "meta" — merged, never mutated
+_META_BASE: Dict[str, Any] = {"source": "SupportPilot-AI"}
+
+
 def build_handoff_payload(
     user_id: str,
     current_state: Optional[str],
@@ -21,16 +25,23 @@ def build_handoff_payload(
     decision_rule: str,
     decision_reason: str,
     kpi_signals: List[str],
+    meta: Optional[Dict[str, Any]] = None,
+    generated_at: Optional[str] = None,
+    agent_constraints: Optional[Dict[str, Any]] = None,
+    conversation_version: Optional[int] = None,
 ) -> Dict[str, Any]:
     """
     Builds a unified escalation payload.
     Defensive: tolerates None values to avoid crashes during first-message escalations.
+
+    meta: extra caller fields (tenant, language, ...) merged into payload["meta"].
+    generated_at: ISO timestamp the caller already has; computed here if omitted.
+    agent_constraints: reply language / lock / RTL rules read by the vendor adapters.
+    conversation_version: caller's session value (the builder never reads session state).
     """
-    return {
-        "meta": {
-            "source": "SupportPilot-AI",
-            "generated_at": _utc_iso(),
-        },
+    payload = {
+        # One dict (the chained | built two throwaway intermediates)
+        "meta": {**_META_BASE, "generated_at": generated_at or _utc_iso(), **(meta or {})},
         "user": {
             "user_id": str(user_id or "unknown"),
         },
@@ -45,4 +56,9 @@ def build_handoff_payload(
             "reason": (decision_reason or ""),
         },
         "kpi_flags": list(kpi_signals or []),
-    }
\ No newline at end of file
+    }
+    if conversation_version is not None:
+        payload["conversation"]["conversation_version"] = int(conversation_version)
+    if agent_constraints:
+        payload["agent_constraints"] = agent_constraints
+    return payload
\ No newline at end of file
@@ -9,6 +9,8 @@
 # ✅ Resets flags only when user becomes active AFTER the nudge
 # ✅ Avoids nudging during handoff/escalation
 # ✅ Debug mode prints claimed count
+# ✅ WA_SESSION_BACKEND=redis: sweeps the Redis session hashes (SCAN + pipelined HMGET)
+# ✅ Optional idle-session purge (WA_SESSION_SWEEP_SECONDS > 0, Postgres only; off by default)
 
 from __future__ import annotations
 
@@ -21,7 +23,7 @@ from typing import Any, Dict, List, Tuple, Optional
 
 import requests
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 
 
 # -----------------------------
@@ -34,6 +36,10 @@ TABLE_NAME = re.sub(r"[^A-Za-z0-9_]", "", _first) or "sessions"
 INACTIVITY_MINUTES = int(os.getenv("INACTIVITY_MINUTES", "10"))
 POLL_SECONDS = int(os.getenv("INACTIVITY_POLL_SECONDS", "60"))
 DEBUG = (os.getenv("INACTIVITY_DEBUG", "false") or "false").strip().lower() in {"1", "true", "yes", "y"}
+WA_SESSION_BACKEND = (os.getenv("WA_SESSION_BACKEND", "pg") or "pg").strip().lower()
+# Deletes Postgres sessions idle longer than WA_SESSION_TTL_SECONDS every N seconds (0 = never).
+# Runs here, between reminder passes, so it never races the claim on the same rows.
+SESSION_SWEEP_SECONDS = int(os.getenv("WA_SESSION_SWEEP_SECONDS", "0"))
 
 WA_TOKEN = (os.getenv("WA_TOKEN") or os.getenv("WA_ACCESS_TOKEN") or "").strip()
 WA_PHONE_NUMBER_ID = (os.getenv("WA_PHONE_NUMBER_ID") or "").strip()
@@ -208,6 +214,19 @@ async def unmark_if_send_failed(engine: AsyncEngine, tenant_id: str, user_id: st
         await conn.execute(stmt, {"tenant_id": tenant_id, "user_id": user_id})
 
 
+async def _send_nudges(candidates: List[Tuple[str, str, Dict[str, Any]]], unmark) -> None:
+    for tenant_id, user_id, sess in candidates:
+        lang = str(sess.get("language") or "en")
+        msg = inactivity_message(lang)
+
+        try:
+            wa_send_text(user_id, msg)
+            print(f"[reminder] nudged tenant={tenant_id} user={user_id} lang={lang}")
+        except Exception as e:
+            print(f"[reminder] send failed tenant={tenant_id} user={user_id}: {e}")
+            await unmark(tenant_id, user_id)
+
+
 # -----------------------------
 # Worker loop
 # -----------------------------
@@ -222,30 +241,73 @@ async def run_once(engine: AsyncEngine) -> None:
     if DEBUG:
         print(f"[reminder] candidates_claimed={len(candidates)} inactivity={INACTIVITY_MINUTES}min table={TABLE_NAME}")
 
-    for tenant_id, user_id, sess in candidates:
-        lang = str(sess.get("language") or "en")
-        msg = inactivity_message(lang)
+    async def _unmark(tenant_id: str, user_id: str) -> None:
+        await unmark_if_send_failed(engine, tenant_id, user_id)
+
+    await _send_nudges(candidates, _unmark)
+
+
+async def purge_idle_sessions(engine: AsyncEngine) -> None:
+    from core.session_store_pg import purge_stale_sessions
 
+    async with AsyncSession(engine) as db:
+        purged = await purge_stale_sessions(db)
+    if purged:
+        print(f"[reminder-worker] purged idle sessions={purged}")
+
+
+async def run_once_redis() -> None:
+    from core.session_store_redis import claim_inactive_sessions, reset_nudged_active_sessions, unmark_nudge
+
+    try:
+        await reset_nudged_active_sessions()
+    except Exception as e:
+        print(f"[reminder] reset_nudged_active_sessions error: {e}")
+
+    cutoff = utcnow() - timedelta(minutes=INACTIVITY_MINUTES)
+    candidates = await claim_inactive_sessions(cutoff.timestamp(), utcnow().isoformat())
+
+    if DEBUG:
+        print(f"[reminder] candidates_claimed={len(candidates)} inactivity={INACTIVITY_MINUTES}min backend=redis")
+
+    await _send_nudges(candidates, unmark_nudge)
+
+
+async def main_redis() -> None:
+    print(f"[reminder-worker] started inactivity={INACTIVITY_MINUTES}min poll={POLL_SECONDS}s backend=redis debug={DEBUG}")
+
+    while True:
         try:
-            wa_send_text(user_id, msg)
-            print(f"[reminder] nudged tenant={tenant_id} user={user_id} lang={lang}")
+            await run_once_redis()
         except Exception as e:
-            print(f"[reminder] send failed tenant={tenant_id} user={user_id}: {e}")
-            await unmark_if_send_failed(engine, tenant_id, user_id)
+            print(f"[reminder-worker] loop error: {e}")
+        await asyncio.sleep(POLL_SECONDS)
 
 
 async def main() -> None:
+    if WA_SESSION_BACKEND == "redis":
+        await main_redis()
+        return
+
     db_url = to_async_db_url(DATABASE_URL)
     engine = create_async_engine(db_url, pool_pre_ping=True)
 
     print(f"[reminder-worker] started inactivity={INACTIVITY_MINUTES}min poll={POLL_SECONDS}s table={TABLE_NAME} debug={DEBUG}")
 
+    loop = asyncio.get_running_loop()
+    next_sweep = loop.time() + SESSION_SWEEP_SECONDS
     try:
         while True:
             try:
                 await run_once(engine)
             except Exception as e:
                 print(f"[reminder-worker] loop error: {e}")
+            if SESSION_SWEEP_SECONDS > 0 and loop.time() >= next_sweep:
+                next_sweep = loop.time() + SESSION_SWEEP_SECONDS
+                try:
+                    await purge_idle_sessions(engine)
+                except Exception as e:
+                    print(f"[reminder-worker] purge error: {e}")
             await asyncio.sleep(POLL_SECONDS)
     finally:
         await engine.dispose()
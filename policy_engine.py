@@ -19,29 +19,20 @@ def _norm(text: str) -> str:
     return (text or "").strip().lower()
 
 
-def _is_greeting(t: str) -> bool:
-    t = _norm(t)
-    return t in {"hi", "hello", "hey", "السلام عليكم", "مرحبا", "أهلاً", "اهلا"}
+# Exact-match phrases → intent tag. One normalization + one dict lookup per message
+# (the phrase sets are disjoint, so a single table is equivalent to the old _is_* chain).
+_EXACT_PHRASES = {
+    "greeting": ("hi", "hello", "hey", "السلام عليكم", "مرحبا", "أهلاً", "اهلا"),
+    "thanks": ("thanks", "thank you", "thx", "شكرا", "شكرًا", "جزاك الله خير"),
+    "goodbye": ("bye", "goodbye", "see you", "مع السلامة", "سلام", "الى اللقاء", "إلى اللقاء"),
+    "no": ("no", "nope", "nah", "لا", "لا شكرا", "لا شكرًا", "ليس الآن", "مو", "مش"),
+    "ack": ("ok", "okay", "k", "sure", "alright", "تمام", "تم", "اوكي", "حسنًا", "حسنا"),
+}
+_EXACT_INTENTS: Dict[str, str] = {p: tag for tag, phrases in _EXACT_PHRASES.items() for p in phrases}
 
 
-def _is_thanks(t: str) -> bool:
-    t = _norm(t)
-    return t in {"thanks", "thank you", "thx", "شكرا", "شكرًا", "جزاك الله خير"}
-
-
-def _is_goodbye(t: str) -> bool:
-    t = _norm(t)
-    return t in {"bye", "goodbye", "see you", "مع السلامة", "سلام", "الى اللقاء", "إلى اللقاء"}
-
-
-def _is_no(t: str) -> bool:
-    t = _norm(t)
-    return t in {"no", "nope", "nah", "لا", "لا شكرا", "لا شكرًا", "ليس الآن", "مو", "مش"}
-
-
-def _is_ack(t: str) -> bool:
-    t = _norm(t)
-    return t in {"ok", "okay", "k", "sure", "alright", "تمام", "تم", "اوكي", "حسنًا", "حسنا"}
+def _exact_intent(t: str) -> Optional[str]:
+    return _EXACT_INTENTS.get(_norm(t))
 
 
 def _needs_order_id(intent: str) -> bool:
@@ -61,28 +52,28 @@ def _prefix_greeting_once(session: Dict[str, Any], language: str, body: str) ->
 
 def decide_next_action(session: Dict[str, Any], language: str, text: str) -> PolicyDecision:
     intent = session.get("intent") or "GENERAL"
-    t = _norm(text)
+    exact = _exact_intent(text)
 
     # Hard close if user says goodbye
-    if _is_goodbye(t):
+    if exact == "goodbye":
         if language == "ar":
             return PolicyDecision(action="CLOSE", reply="مع السلامة! إذا احتجت أي شيء، أنا موجود. ✅")
         return PolicyDecision(action="CLOSE", reply="Goodbye! If you need anything else, I’m here. ✅")
 
     # If user says thanks and we are resolved: close politely or ask if anything else
-    if _is_thanks(t):
+    if exact == "thanks":
         if language == "ar":
             return PolicyDecision(action="GREET_ONLY", reply=_prefix_greeting_once(session, language, "على الرحب والسعة ✅ هل هناك أي شيء آخر يمكنني مساعدتك به؟"))
         return PolicyDecision(action="GREET_ONLY", reply=_prefix_greeting_once(session, language, "You’re welcome ✅ Is there anything else I can help you with?"))
 
     # If user says "no" after a response → close (avoid loops)
-    if _is_no(t):
+    if exact == "no":
         if language == "ar":
             return PolicyDecision(action="CLOSE", reply=_prefix_greeting_once(session, language, "شكرًا لك. إذا احتجت أي مساعدة لاحقًا أنا موجود. 🌟"))
         return PolicyDecision(action="CLOSE", reply=_prefix_greeting_once(session, language, "Thank you. If you need any help later, I’m here. 🌟"))
 
     # Greeting only (but do NOT block the real intent if text includes refund/order)
-    if _is_greeting(t) and intent == "GREETING":
+    if exact == "greeting" and intent == "GREETING":
         if language == "ar":
             return PolicyDecision(action="GREET_ONLY", reply="مرحبًا! كيف يمكنني مساعدتك اليوم؟")
         return PolicyDecision(action="GREET_ONLY", reply="Hello! How may I assist you today?")
@@ -1,13 +1,33 @@
+import os
+
+# Explicit VIP ids (comma-separated) → O(1) membership check per call
+VIP_USER_IDS = frozenset(
+    u.strip() for u in (os.getenv("VIP_USER_IDS") or "").split(",") if u.strip()
+)
+
+
+def is_vip_user(user_id) -> bool:
+    """
+    Single VIP definition; evaluated once per session (stored as session["is_vip"])
+    """
+
+    # Example VIP rules (mock)
+    uid = str(user_id or "")
+    return uid in VIP_USER_IDS or uid.startswith("vip_")
+
+
 def get_customer_priority(user_id, session, kpi_signals):
     """
     Returns priority level and reason
     """
 
-    # Example VIP rules (mock)
-    if user_id.startswith("vip_"):
+    is_vip = session.get("is_vip")
+    if is_vip is None:  # sessions created before the flag existed
+        is_vip = is_vip_user(user_id)
+    if is_vip:
         return "P0", "VIP customer"
 
-    if "sla_breach_detected" in kpi_signals:
+    if kpi_signals and "sla_breach_detected" in kpi_signals:
         return "P0", "SLA breach"
 
     if session.get("state") == "ESCALATION":
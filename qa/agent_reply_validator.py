@@ -6,6 +6,9 @@
 from typing import Dict
 import re
 
+_ARABIC_RE = re.compile(r"[\u0600-\u06FF]")
+_LATIN_RE = re.compile(r"[a-zA-Z]")
+
 
 # =========================================================
 # Public Entry Point
@@ -129,7 +132,7 @@ def detect_reply_language(text: str) -> str:
     if contains_arabic_characters(text):
         return "ar"
 
-    if re.search(r"[a-zA-Z]", text):
+    if _LATIN_RE.search(text):
         return "en"
 
     return "unknown"
@@ -139,7 +142,7 @@ def contains_arabic_characters(text: str) -> bool:
     """
     Detect Arabic Unicode block.
     """
-    return re.search(r"[\u0600-\u06FF]", text) is not None
+    return _ARABIC_RE.search(text) is not None
 
 
 # =========================================================
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import json
 import math
+import re
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -156,10 +157,13 @@ def search_knowledge(query: str, client_data: List[Dict[str, Any]], top_k: int =
 # Answer generation + validation
 # ----------------------------
 
+# Hedging phrases that fail validation; one case-insensitive scan (no .lower() copy)
+_UNCERTAIN_PHRASES = ["i think", "maybe", "not sure", "probably", "guess"]
+_UNCERTAIN_RE = re.compile("|".join(re.escape(p) for p in _UNCERTAIN_PHRASES), re.IGNORECASE)
+
+
 def validate_answer(answer: str) -> bool:
-    bad_phrases = ["i think", "maybe", "not sure", "probably", "guess"]
-    a = (answer or "").lower()
-    return not any(p in a for p in bad_phrases)
+    return not _UNCERTAIN_RE.search(answer or "")
 
 
 def build_system_prompt(context_chunks: List[RetrievedChunk], tone: str, client_config: Dict[str, Any], language: str) -> str:
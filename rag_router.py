@@ -1,36 +1,137 @@
 # rag_router.py
 from __future__ import annotations
 
+import json
 import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
 
 
 SP_API_BASE = (os.getenv("SP_API_BASE", "http://127.0.0.1:8000") or "").strip()
 WA_DEFAULT_CLIENT = (os.getenv("WA_DEFAULT_CLIENT", "supportpilot_demo") or "").strip()
+_CHAT_URL = f"{SP_API_BASE.rstrip('/')}/chat" if SP_API_BASE else ""
 
+# Keep-alive connection pool to the chat backend (no TCP/TLS handshake per message)
+_HTTP = requests.Session()
+# Only a failed connect is retried: that POST never reached the backend. Read errors
+# and 5xx are not retried, since /chat is a non-idempotent POST.
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(total=1, connect=1, read=0, status=0, backoff_factor=0.1),
+)
+_HTTP.mount("http://", _adapter)
+_HTTP.mount("https://", _adapter)
 
-def call_rag_chat(user_id: str, session: Dict[str, Any], user_message: str, language: str) -> str:
-    if not SP_API_BASE:
-        return "System error: SP_API_BASE not configured"
+CHAT_TIMEOUT = (3, 22)  # (connect, read) seconds
+_JSON_HEADERS = {"content-type": "application/json"}
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dumps(value: Dict[str, Any]) -> bytes:
+    # Request body as UTF-8 bytes (the payload is plain str fields, so orjson never rejects it)
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+# Error lines are capped per window: a backend outage would otherwise print one per message
+_ERR_WINDOW_SECONDS = 60.0
+_ERR_MAX_PER_WINDOW = int(os.getenv("RAG_ERROR_LOG_MAX_PER_MINUTE", "10"))
+
+
+class _ErrorBucket:
+    def __init__(self, limit: int, window: float) -> None:
+        self._limit = limit
+        self._window = window
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._count = 0
+        self._suppressed = 0
+        self._timer: threading.Timer | None = None
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        flushed = 0
+        with self._lock:
+            if now - self._window_start >= self._window:
+                flushed = self._suppressed
+                self._window_start = now
+                self._count = 0
+                self._suppressed = 0
+            self._count += 1
+            ok = self._count <= self._limit
+            if not ok:
+                self._suppressed += 1
+                if self._timer is None:
+                    # Report the burst when its window ends, even if no later error arrives
+                    self._timer = threading.Timer(self._window_start + self._window - now, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        self._report(flushed)
+        return ok
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            flushed = self._suppressed
+            self._suppressed = 0
+        self._report(flushed)
+
+    def _report(self, flushed: int) -> None:
+        if flushed:
+            print(f"[rag] +{flushed} chat errors suppressed in the last {int(self._window)}s")
 
-    url = f"{SP_API_BASE}/chat"
-    payload = {
+
+_ERR_BUCKET = _ErrorBucket(_ERR_MAX_PER_WINDOW, _ERR_WINDOW_SECONDS)
+
+
+def _log_chat_error(e: Exception) -> None:
+    if _ERR_BUCKET.allow():
+        print("[rag] chat call error:", repr(e))
+
+
+def _chat_payload(user_message: str, language: str) -> Dict[str, Any]:
+    return {
         "client_name": WA_DEFAULT_CLIENT,
         "question": user_message,
         "tone": "formal",
         "language": "ar" if language == "ar" else "en",
     }
 
+
+def _answer_from(r) -> str:
+    if r.status_code != 200:
+        try:
+            j = _loads(r.content)
+            return (j.get("detail") or str(j))[:500]
+        except Exception:
+            return "AI server error"
+    data = _loads(r.content)
+    return (data.get("answer") or "").strip() or "Sorry — I couldn't generate a response."
+
+
+def call_rag_chat(user_id: str, session: Dict[str, Any], user_message: str, language: str) -> str:
+    if not _CHAT_URL:
+        return "System error: SP_API_BASE not configured"
+
     try:
-        r = requests.post(url, json=payload, timeout=25)
-        if r.status_code != 200:
-            try:
-                j = r.json()
-                return (j.get("detail") or str(j))[:500]
-            except Exception:
-                return "AI server error"
-        data = r.json()
-        return (data.get("answer") or "").strip() or "Sorry — I couldn't generate a response."
-    except Exception:
-        return "System temporarily unavailable"
\ No newline at end of file
+        r = _HTTP.post(
+            _CHAT_URL,
+            data=_dumps(_chat_payload(user_message, language)),
+            headers=_JSON_HEADERS,
+            timeout=CHAT_TIMEOUT,
+        )
+        return _answer_from(r)
+    except Exception as e:
+        _log_chat_error(e)
+        return "System temporarily unavailable"
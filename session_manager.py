@@ -1,53 +1,102 @@
+import threading
 import time
+import weakref
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class SessionState:
+    # Fixed fields + __slots__: no per-session __dict__, attribute access without hashing
+    state: str = "START"
+    data: dict = field(default_factory=dict)
+    retries: dict = field(default_factory=dict)
+    abuse_strikes: int = 0
+    tries: int = 0
+    last_active: float = 0.0
 
 
 class SessionManager:
-    def __init__(self, timeout=300):
+    def __init__(self, timeout=300, sweep_interval=0):
+        # sweep_interval > 0 starts the eviction thread here; otherwise call start_sweeper()
         self.sessions = {}
         self.timeout = timeout
+        self._sweeper = None
+        if sweep_interval and sweep_interval > 0:
+            self.start_sweeper(sweep_interval)
 
     def _now(self):
         return time.time()
 
     def get(self, user_id):
+        now = self._now()
         session = self.sessions.get(user_id)
 
         # Create new session or reset on timeout
-        if not session or self._now() - session["last_active"] > self.timeout:
-            session = {
-                "state": "START",
-                "data": {},
-                "retries": {},
-                "abuse_strikes": 0,
-                "last_active": self._now(),
-            }
+        if not session or now - session.last_active > self.timeout:
+            session = SessionState(last_active=now)
             self.sessions[user_id] = session
 
-        session["last_active"] = self._now()
+        session.last_active = now
         return session
 
     def set_state(self, user_id, state):
         session = self.get(user_id)
-        session["state"] = state
-        session["retries"][state] = 0
+        session.state = state
+        session.retries[state] = 0
 
     def increment_retry(self, user_id):
         session = self.get(user_id)
-        state = session["state"]
-        session["retries"][state] = session["retries"].get(state, 0) + 1
-        return session["retries"][state]
+        state = session.state
+        session.retries[state] = session.retries.get(state, 0) + 1
+        return session.retries[state]
 
     def increment_abuse(self, user_id):
         session = self.get(user_id)
-        session["abuse_strikes"] += 1
-        return session["abuse_strikes"]
+        session.abuse_strikes += 1
+        return session.abuse_strikes
 
     def set_data(self, user_id, key, value):
         session = self.get(user_id)
-        session["data"][key] = value
+        session.data[key] = value
 
     def increment_tries(self, user_id):
-        self.sessions[user_id]["tries"] += 1
+        self.get(user_id).tries += 1
 
     def reset_tries(self, user_id):
-        self.sessions[user_id]["tries"] = 0
+        self.get(user_id).tries = 0
+
+    # -------------------------------------------------
+    # Eviction (get() only resets expired sessions it is asked for;
+    # users who never come back would otherwise stay in memory forever)
+    # -------------------------------------------------
+
+    def purge_expired(self):
+        cutoff = self._now() - self.timeout
+        purged = 0
+        for user_id, session in list(self.sessions.items()):
+            if session.last_active < cutoff and self.sessions.get(user_id) is session:
+                del self.sessions[user_id]
+                purged += 1
+        return purged
+
+    def start_sweeper(self, interval=300):
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        # Weak ref: the sweeper must not keep a discarded manager (and its sessions) alive
+        ref = weakref.ref(self)
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                manager = ref()
+                if manager is None:
+                    return
+                try:
+                    manager.purge_expired()
+                except Exception as e:
+                    print("[session] sweep error:", repr(e))
+                del manager
+
+        self._sweeper = threading.Thread(target=_run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
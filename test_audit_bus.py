@@ -0,0 +1,37 @@
+# test_audit_bus.py
+# Background audit queue: non-blocking submit under backpressure, sink failures counted.
+
+import threading
+import time
+
+from compliance.audit_bus import AuditBus
+
+
+def test_submit_drops_instead_of_blocking_when_full():
+    release = threading.Event()
+    bus = AuditBus(sink=lambda batch: release.wait(5), batch_size=1, high_water=1)
+
+    started = time.monotonic()
+    for i in range(20):
+        bus.submit({"i": i})
+    elapsed = time.monotonic() - started
+    release.set()
+    bus.flush()
+
+    assert elapsed < 0.2
+    assert bus.dropped >= 18
+    assert bus.stats()["dropped"] == bus.dropped
+
+
+def test_sink_failure_is_counted_in_stats():
+    def failing_sink(batch):
+        raise OSError("disk full")
+
+    bus = AuditBus(sink=failing_sink, batch_size=10, batch_wait=0)
+    bus.submit({"event": "a"})
+    bus.submit({"event": "b"})
+    bus.flush()
+
+    stats = bus.stats()
+    assert stats["sink_errors"] == 2
+    assert stats["queued"] == 0
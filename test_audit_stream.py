@@ -0,0 +1,69 @@
+# test_audit_stream.py
+# Audit sinks: Redis Streams XADD, JSONL fallback, and sink selection from AUDIT_REDIS_STREAM.
+
+import importlib
+import json
+
+from compliance import audit_logger
+
+
+class _Pipe:
+    def __init__(self, out, fail):
+        self._out = out
+        self._fail = fail
+
+    def xadd(self, name, fields, maxlen=None, approximate=False):
+        self._out.append((name, fields, maxlen, approximate))
+
+    def execute(self):
+        if self._fail:
+            raise ConnectionError("redis down")
+
+
+class _Client:
+    def __init__(self, fail=False):
+        self.added = []
+        self._fail = fail
+
+    def pipeline(self, transaction=True):
+        return _Pipe(self.added, self._fail)
+
+
+def _use(monkeypatch, tmp_path, client):
+    monkeypatch.setattr(audit_logger, "AUDIT_REDIS_STREAM", "wa:audit")
+    monkeypatch.setattr(audit_logger, "_stream_client", client)
+    monkeypatch.setattr(audit_logger, "AUDIT_LOG_PATH", tmp_path / "audit_log.jsonl")
+
+
+def test_stream_events_xadds_each_event(monkeypatch, tmp_path):
+    client = _Client()
+    _use(monkeypatch, tmp_path, client)
+
+    audit_logger.stream_events([{"event": "escalation", "user": "u1"}, "not-a-dict", {"event": "x"}])
+
+    assert [(n, json.loads(f["event"])) for n, f, _, _ in client.added] == [
+        ("wa:audit", {"event": "escalation", "user": "u1"}),
+        ("wa:audit", {"event": "x"}),
+    ]
+    assert all(m == audit_logger.AUDIT_STREAM_MAXLEN and approx for _, _, m, approx in client.added)
+    assert not (tmp_path / "audit_log.jsonl").exists()
+
+
+def test_stream_events_falls_back_to_jsonl(monkeypatch, tmp_path):
+    _use(monkeypatch, tmp_path, _Client(fail=True))
+
+    audit_logger.stream_events([{"event": "escalation"}])
+
+    lines = (tmp_path / "audit_log.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [{"event": "escalation"}]
+
+
+def test_default_sink_follows_env(monkeypatch):
+    try:
+        monkeypatch.setenv("AUDIT_REDIS_STREAM", "wa:audit")
+        assert importlib.reload(audit_logger).default_sink is audit_logger.stream_events
+
+        monkeypatch.delenv("AUDIT_REDIS_STREAM")
+        assert importlib.reload(audit_logger).default_sink is audit_logger.log_events
+    finally:
+        importlib.reload(audit_logger)
@@ -0,0 +1,124 @@
+# test_escalation.py
+# Controller handoff paths: dedupe window, failed dispatch retry, late ticket ref.
+# Sessions live in a dict and ticket dispatch is replaced, so no DB / vendor is needed.
+
+import asyncio
+import sys
+import time
+import types
+
+import pytest
+
+import whatsapp_controller as wc
+
+USER = "966500000001"
+TENANT = "t_test"
+
+
+class _NullDB:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def store(monkeypatch):
+    sessions = {}
+
+    async def get_session(db, *, user_id, tenant_id=None):
+        s = sessions.get(user_id)
+        return dict(s) if s is not None else None
+
+    async def upsert_session(db, *, user_id, session, tenant_id=None):
+        sessions[user_id] = dict(session)
+
+    monkeypatch.setattr(wc, "get_session", get_session)
+    monkeypatch.setattr(wc, "upsert_session", upsert_session)
+    monkeypatch.setattr(wc, "_distributed_session_lock", None)
+    monkeypatch.setitem(sys.modules, "database", types.SimpleNamespace(AsyncSessionLocal=_NullDB))
+    return sessions
+
+
+def _dispatcher(monkeypatch, result, delay=0.0):
+    calls = []
+
+    def dispatch(payload, **kw):
+        calls.append(payload)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    monkeypatch.setattr(wc, "_dispatch_and_audit", dispatch)
+    return calls
+
+
+async def _say(*messages):
+    replies = []
+    for m in messages:
+        reply, meta = await wc.handle_message(db=None, user_id=USER, message_text=m, tenant_id=TENANT)
+        replies.append((reply, meta))
+    return replies
+
+
+def test_reescalation_within_window_reuses_ticket(store, monkeypatch):
+    calls = _dispatcher(monkeypatch, {"ticket_id": "abcd1234-0001"})
+
+    out = asyncio.run(_say("hi", "99", "0", "99"))
+
+    assert len(calls) == 1
+    assert out[1][1]["ticket_id"] == out[3][1]["ticket_id"] == "abcd1234-0001"
+    assert "#ABCD1234" in out[3][0]
+
+
+def test_reescalation_after_window_dispatches_again(store, monkeypatch):
+    calls = _dispatcher(monkeypatch, {"ticket_id": "abcd1234-0001"})
+    monkeypatch.setattr(wc, "ESCALATION_DEDUPE_SECONDS", 0)
+
+    asyncio.run(_say("hi", "99", "0", "99"))
+
+    assert len(calls) == 2
+
+
+def test_failed_dispatch_is_retried(store, monkeypatch):
+    # _dispatch_and_audit returns {} when routing / the vendor raised
+    calls = _dispatcher(monkeypatch, {})
+
+    out = asyncio.run(_say("hi", "99", "0", "99"))
+
+    assert len(calls) == 2
+    assert out[3][1]["ticket_id"] is None
+    assert store[USER]["escalated_at"] is None
+    assert "Ref" not in out[3][0]
+
+
+def test_late_ticket_ref_is_recorded_and_reused(store, monkeypatch):
+    calls = _dispatcher(monkeypatch, {"ticket_id": "late0001-xyz"}, delay=0.1)
+    monkeypatch.setattr(wc, "ESCALATION_DISPATCH_WAIT_SECONDS", 0.01)
+
+    async def scenario():
+        first = await _say("hi", "99")
+        assert first[1][1]["ticket_id"] is None
+        await asyncio.gather(*list(wc._late_ticket_tasks))
+        assert store[USER]["last_ticket_id"] == "late0001-xyz"
+        return await _say("0", "99")
+
+    out = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert out[1][1]["ticket_id"] == "late0001-xyz"
+
+
+def test_late_ticket_ref_skipped_after_user_left_handoff(store, monkeypatch):
+    _dispatcher(monkeypatch, {"ticket_id": "late0002-xyz"}, delay=0.1)
+    monkeypatch.setattr(wc, "ESCALATION_DISPATCH_WAIT_SECONDS", 0.01)
+
+    async def scenario():
+        await _say("hi", "99", "0")
+        await asyncio.gather(*list(wc._late_ticket_tasks))
+
+    asyncio.run(scenario())
+
+    assert store[USER]["last_ticket_id"] is None
+    assert store[USER]["handoff_active"] is False
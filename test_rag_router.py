@@ -0,0 +1,26 @@
+# test_rag_router.py
+# Chat backend error-line limiter: per-window cap and the "+K suppressed" report.
+
+import time
+
+from rag_router import _ErrorBucket
+
+
+def test_burst_is_capped_and_reported_when_the_window_ends(capsys):
+    bucket = _ErrorBucket(limit=2, window=0.2)
+
+    allowed = [bucket.allow() for _ in range(5)]
+    time.sleep(0.4)  # no further errors: the report must not wait for one
+
+    assert allowed == [True, True, False, False, False]
+    assert "[rag] +3 chat errors suppressed" in capsys.readouterr().out
+
+
+def test_quiet_window_reports_nothing(capsys):
+    bucket = _ErrorBucket(limit=2, window=0.1)
+
+    assert bucket.allow() and bucket.allow()
+    time.sleep(0.2)
+    assert bucket.allow()
+
+    assert "suppressed" not in capsys.readouterr().out
@@ -0,0 +1,119 @@
+# test_session_store_redis.py
+# Redis session store against fakeredis (with Lua): whole-session writes, lock + save/unlock
+# script, and the inactivity claim.
+
+import asyncio
+import time
+
+import pytest
+
+# Test-only dependency (pip install "fakeredis[lua]"); lupa runs the store's Lua scripts
+fakeredis = pytest.importorskip("fakeredis", reason="needs fakeredis[lua]")
+pytest.importorskip("lupa", reason="needs fakeredis[lua]")
+
+from core import session_store_redis as store
+
+T, U = "t_test", "966500000001"
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    server = fakeredis.FakeServer()
+
+    def _client():
+        return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+    monkeypatch.setattr(store, "_client", _client)
+    monkeypatch.setattr(store, "_cache", None)
+    return _client()
+
+
+def test_upsert_replaces_the_whole_session(redis_client):
+    async def scenario():
+        await store.upsert_session(user_id=U, tenant_id=T, session={"state": "MENU", "doctor": "x"})
+        await store.upsert_session(user_id=U, tenant_id=T, session={"state": "MENU"})
+        return await store.get_session(user_id=U, tenant_id=T), await redis_client.ttl(store._key(T, U))
+
+    session, ttl = asyncio.run(scenario())
+
+    assert session == {"state": "MENU"}
+    assert ttl > 0
+
+
+def test_locked_turn_saves_and_releases_in_one_script(redis_client):
+    async def scenario():
+        await store.upsert_session(user_id=U, tenant_id=T, session={"state": "MENU", "doctor": "x"})
+        async with store.session_lock(T, U) as acquired:
+            assert acquired
+            assert await redis_client.exists(f"{store.LOCK_PREFIX}:{T}:{U}")
+            session = await store.get_session(user_id=U, tenant_id=T)
+            session.pop("doctor")
+            session["state"] = "BOOK_DEPT"
+            await store.upsert_session(user_id=U, tenant_id=T, session=session)
+            # released by the save+unlock script, before the context exits
+            assert not await redis_client.exists(f"{store.LOCK_PREFIX}:{T}:{U}")
+        return await store.get_session(user_id=U, tenant_id=T)
+
+    assert asyncio.run(scenario()) == {"state": "BOOK_DEPT"}
+
+
+def test_turn_without_write_releases_lock(redis_client):
+    async def scenario():
+        async with store.session_lock(T, U) as acquired:
+            assert acquired
+        return await redis_client.exists(f"{store.LOCK_PREFIX}:{T}:{U}")
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_busy_lock_times_out_and_is_left_to_its_owner(redis_client, monkeypatch):
+    monkeypatch.setattr(store, "LOCK_WAIT_SECONDS", 0.2)
+    lock_key = f"{store.LOCK_PREFIX}:{T}:{U}"
+
+    async def scenario():
+        await redis_client.set(lock_key, "other-worker")
+        async with store.session_lock(T, U) as acquired:
+            assert not acquired
+            await store.upsert_session(user_id=U, tenant_id=T, session={"state": "MENU"})
+        return await redis_client.get(lock_key)
+
+    assert asyncio.run(scenario()) == "other-worker"
+
+
+def test_claim_inactive_sessions_claims_once(redis_client):
+    idle = time.time() - 3600
+
+    async def scenario():
+        await store.upsert_session(user_id=U, tenant_id=T, session={"status": "ACTIVE", "last_user_epoch": idle})
+        await store.upsert_session(
+            user_id="busy", tenant_id=T, session={"status": "ACTIVE", "last_user_epoch": time.time()}
+        )
+        first = await store.claim_inactive_sessions(time.time() - 60, "2026-01-01T00:00:00+00:00")
+        second = await store.claim_inactive_sessions(time.time() - 60, "2026-01-01T00:00:00+00:00")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert [(t, u) for t, u, _ in first] == [(T, U)]
+    assert second == []
+
+
+def test_claim_skips_key_expired_since_scan(redis_client, monkeypatch):
+    idle = time.time() - 3600
+    key = store._key(T, U)
+    scan = store._scan_sweep_fields
+
+    async def scan_then_expire(client):
+        rows = [row async for row in scan(client)]
+        await redis_client.delete(key)
+        for row in rows:
+            yield row
+
+    monkeypatch.setattr(store, "_scan_sweep_fields", scan_then_expire)
+
+    async def scenario():
+        await store.upsert_session(user_id=U, tenant_id=T, session={"status": "ACTIVE", "last_user_epoch": idle})
+        claimed = await store.claim_inactive_sessions(time.time() - 60, "2026-01-01T00:00:00+00:00")
+        return claimed, await redis_client.exists(key)
+
+    assert asyncio.run(scenario()) == ([], 0)
@@ -0,0 +1,16 @@
+# test_text_match.py
+# Shared keyword alternation used by core.engine, core.nlu and whatsapp_bot.
+
+from core.text_match import keyword_re
+
+
+def test_matches_like_any_substring():
+    pat = keyword_re(["book", "موعد", "a.b"])
+    for text in ("i want to book", "أريد موعد", "xa.by", "nothing here", "axb"):
+        assert bool(pat.search(text)) == any(w in text for w in ["book", "موعد", "a.b"])
+
+
+def test_empty_words_and_empty_list_never_match_everything():
+    assert keyword_re(["", "thanks"]).search("hello") is None
+    assert keyword_re([""]).search("hello") is None
+    assert keyword_re([]).search("hello") is None
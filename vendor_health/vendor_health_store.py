@@ -5,15 +5,10 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+import time
 from typing import Dict, Any, Optional
 
 
-def _utcnow() -> datetime:
-    # naive UTC is fine for this use-case (consistent with your original code)
-    return datetime.utcnow()
-
-
 def _norm_vendor(vendor: str) -> str:
     return (vendor or "").strip().lower()
 
@@ -26,7 +21,8 @@ _VENDOR_HEALTH: Dict[str, Dict[str, Any]] = {
 
 FAILURE_THRESHOLD = 3          # failures before disabling
 DISABLE_DURATION_MIN = 10      # cooldown window
-
+# disabled_until is a time.monotonic() deadline (float seconds), not a datetime:
+# cheap to compare and immune to wall-clock jumps (NTP adjustments).
 
 def _get_record(vendor: str) -> Optional[Dict[str, Any]]:
     v = _norm_vendor(vendor)
@@ -47,7 +43,7 @@ def is_vendor_healthy(vendor: str) -> bool:
     try:
         disabled_until = record.get("disabled_until")
         if disabled_until:
-            if _utcnow() < disabled_until:
+            if time.monotonic() < disabled_until:
                 return False
             # Auto-recover after cooldown
             record["disabled_until"] = None
@@ -70,7 +66,7 @@ def record_failure(vendor: str) -> None:
 
         if record["failures"] >= FAILURE_THRESHOLD:
             record["healthy"] = False
-            record["disabled_until"] = _utcnow() + timedelta(minutes=DISABLE_DURATION_MIN)
+            record["disabled_until"] = time.monotonic() + DISABLE_DURATION_MIN * 60
     except Exception:
         return
 
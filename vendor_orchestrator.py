@@ -22,25 +22,27 @@ def _norm_vendor(vendor: str) -> str:
     return (vendor or "").strip().lower()
 
 
+# Where adapters put the ticket id, in lookup order (first truthy value wins)
+_TICKET_ID_PATHS = (
+    ("ticket_id",),
+    ("ticket", "id"),
+    ("ticket", "idempotency_key"),
+    ("ticket", "unique_external_id"),
+)
+
+
 def _extract_ticket_id(adapter_result: dict) -> Optional[str]:
     """
     Best-effort extraction of ticket id across adapters.
     With aligned adapters, this will be adapter_result['ticket_id'].
     Kept defensive for safety.
     """
-    if not isinstance(adapter_result, dict):
-        return None
-
-    tid = adapter_result.get("ticket_id")
-    if tid:
-        return str(tid)
-
-    ticket = adapter_result.get("ticket") or {}
-    if isinstance(ticket, dict):
-        tid = ticket.get("id") or ticket.get("idempotency_key") or ticket.get("unique_external_id")
-        if tid:
-            return str(tid)
-
+    for path in _TICKET_ID_PATHS:
+        v = adapter_result
+        for key in path:
+            v = v.get(key) if isinstance(v, dict) else None
+        if v:
+            return str(v)
     return None
 
 
@@ -1,11 +1,11 @@
 # whatsapp_controller.py
 from __future__ import annotations
 
-import re
 import time
 from typing import Dict, Tuple, Any
 
 from core.engine import run_engine
+from core.text_match import keyword_re
 
 STATE_MAIN_MENU = "MAIN_MENU"
 STATE_HANDOFF = "HUMAN_HANDOFF"
@@ -35,11 +35,14 @@ SPECIALTY_KEYWORDS = {
     "urology": ["urinate", "بول", "تبول"],
 }
 
+_SPECIALTY_RES = [(spec, keyword_re(words)) for spec, words in SPECIALTY_KEYWORDS.items()]
+
+
 def detect_specialty(text: str):
     t = (text or "").lower()
 
-    for spec, words in SPECIALTY_KEYWORDS.items():
-        if any(w in t for w in words):
+    for spec, rx in _SPECIALTY_RES:
+        if rx.search(t):
             return spec
     return None
 
@@ -61,19 +64,24 @@ URGENT_SIGNS = [
     "fever",
 ]
 
+_SEVERE_RE = keyword_re(SEVERE_SIGNS)
+_URGENT_RE = keyword_re(URGENT_SIGNS)
+
+
 def classify_medical(text: str):
     t = text.lower()
 
-    if any(w in t for w in SEVERE_SIGNS):
+    if _SEVERE_RE.search(t):
         return "emergency"
 
-    if any(w in t for w in URGENT_SIGNS):
+    if _URGENT_RE.search(t):
         return "urgent"
 
     return None
 
 
 THANK_WORDS = ["thanks", "thank you", "شكرا", "شكراً"]
+_THANK_RE = keyword_re(THANK_WORDS)
 
 
 # =========================================================
@@ -94,7 +102,7 @@ async def handle_whatsapp_message(
     # -----------------------------------------------------
     # THANK YOU HANDLING
     # -----------------------------------------------------
-    if any(w in text.lower() for w in THANK_WORDS):
+    if _THANK_RE.search(text.lower()):
         lang = sess.get("language", "en")
         reply = (
             "العفو ✅ اكتب 0 لعرض القائمة."
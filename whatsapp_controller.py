@@ -5,7 +5,8 @@
 # ✅ Keep Reception = 99 (not 9)
 # ✅ Store last_intent for better handoff payloads
 # ✅ Deterministic language resolution (AR chars -> ar, EN chars -> en)
-# ✅ Upsert new session immediately to prevent duplicate webhook race
+# ✅ Per-user session lock (plus a Redis lock on the redis backend) serializes duplicate webhooks;
+#    each turn reads the session once and writes it exactly once
 # ✅ NEW: Always return meta["actions"] so api_server can persist appointment_requests
 #
 # IMPORTANT:
@@ -13,39 +14,104 @@
 
 from __future__ import annotations
 
+import asyncio
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from functools import lru_cache
 from typing import Any, Dict, Optional, Tuple, List
 from datetime import datetime, timezone, timedelta
 
-import anyio
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from language.language_detector import detect_language
-from language.arabic_tone_engine import select_arabic_tone
-
 from core.engine import run_engine
-from core.session_store_pg import get_session, upsert_session
 
 from incident.incident_state import is_incident_mode
+from compliance.audit_bus import audit_bus
+from compliance.audit_events import escalation_event
 
-from escalation_router import route_escalation
-from handoff_builder import build_handoff_payload
-from vendor_orchestrator import dispatch_ticket
+from priority_engine import is_vip_user
 
 
 WA_DEFAULT_CLIENT = (os.getenv("WA_DEFAULT_CLIENT", "supportpilot_demo") or "").strip()
 
+# Session backend: "pg" (default, sessions table) or "redis" (hash per user with TTL)
+WA_SESSION_BACKEND = (os.getenv("WA_SESSION_BACKEND", "pg") or "pg").strip().lower()
+
+if WA_SESSION_BACKEND == "redis":
+    from core.session_store_redis import get_session, upsert_session
+    from core.session_store_redis import session_lock as _distributed_session_lock
+else:
+    from core.session_store_pg import get_session, upsert_session
+    _distributed_session_lock = None
+
 _AGENT_KEYS = [
     "agent", "reception", "human", "representative", "help", "support",
     "موظف", "الاستقبال", "استقبال", "إنسان", "موظف الاستقبال", "موظف استقبال"
 ]
+# One C-level scan instead of a Python-level `k in t` per keyword
+_AGENT_RE = re.compile("|".join(re.escape(k) for k in _AGENT_KEYS))
 
 HANDOFF_STICKY_MINUTES = 30
 
+# Fields every new controller session starts with (immutable values only)
+_NEW_SESSION_TEMPLATE: Dict[str, Any] = {
+    "status": "ACTIVE",
+    "state": "LANG_SELECT",
+    "last_step": "LANG_SELECT",
+    "language": "en",
+    "language_locked": False,
+    "text_direction": "ltr",
+    "has_greeted": False,
+    "conversation_version": 6,
+    "escalation_flag": False,
+    "urgent_flag": False,
+    "handoff_active": False,
+    "handoff_until": None,
+    "last_ticket_id": None,
+    "escalated_at": None,
+    "last_intent": None,
+}
+
+# (is_arabic, has_ticket_ref) -> reception handoff reply; the no-ref variants are used as-is
+_HANDOFF_REPLIES: Dict[Tuple[bool, bool], str] = {
+    (True, True): "تم تحويلكم إلى موظف الاستقبال ✅ رقم الطلب: #{ref}\nللعودة للقائمة اكتب 0",
+    (True, False): "تم تحويلكم إلى موظف الاستقبال ✅\nللعودة للقائمة اكتب 0",
+    (False, True): "Connecting you to Reception ✅ Ref: #{ref}\nReply 0 for the menu",
+    (False, False): "Connecting you to Reception ✅\nReply 0 for the menu",
+}
+
+# Ticket dispatch runs on its own pool; the reply waits at most this long for a ticket ref
+# (0 = reply at once). A ref that arrives later is written to the session in the background.
+ESCALATION_DISPATCH_WAIT_SECONDS = float(os.getenv("WA_ESCALATION_WAIT_SECONDS", "2.0"))
+_dispatch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ticket-dispatch")
+_late_ticket_tasks: set = set()  # strong refs until each task finishes
+# Re-escalating within this window reuses the last ticket (no second vendor dispatch)
+ESCALATION_DEDUPE_SECONDS = int(os.getenv("WA_ESCALATION_DEDUPE_SECONDS", "600"))
+
+# Sharded per-user locks: two webhook deliveries for one user must not interleave their
+# session read-modify-write, while different users still proceed in parallel.
+# Per process only; with the Redis backend a Redis lock also serializes across workers.
+_SESSION_LOCK_SHARDS = 32
+_session_locks = tuple(asyncio.Lock() for _ in range(_SESSION_LOCK_SHARDS))
+
+
+def _session_lock(tenant_id: str, user_id: str) -> asyncio.Lock:
+    return _session_locks[hash((tenant_id, user_id)) % _SESSION_LOCK_SHARDS]
+
+
+async def _enter_session_locks(stack: AsyncExitStack, tenant_id: str, user_id: str) -> None:
+    # Redis lock first: waiting on another worker's turn must not hold a shard lock
+    # (and stall every other user hashed to that shard) while it polls
+    if _distributed_session_lock is not None:
+        await stack.enter_async_context(_distributed_session_lock(tenant_id, user_id))
+    await stack.enter_async_context(_session_lock(tenant_id, user_id))
+
 _AR_RE = re.compile(r"[\u0600-\u06FF]")
 _EN_RE = re.compile(r"[A-Za-z]")
-_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
+# One translate pass: Arabic digits -> ASCII, separator punctuation dropped
+_INPUT_TABLE = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789", "،,٫;؛。")
 
 
 def _utcnow() -> datetime:
@@ -61,12 +127,7 @@ def _looks_english(text: str) -> bool:
 
 
 def _normalize_input(text: str) -> str:
-    t = (text or "").strip()
-    for ch in ["،", ",", "٫", ";", "؛", "。"]:
-        t = t.replace(ch, "")
-    t = t.translate(_ARABIC_DIGITS)
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
+    return " ".join((text or "").translate(_INPUT_TABLE).split())
 
 
 def _norm_tenant(tenant_id: Optional[str]) -> str:
@@ -83,19 +144,26 @@ def _parse_iso(s: Optional[str]) -> Optional[datetime]:
         return None
 
 
-def _handoff_active(session: Dict[str, Any]) -> bool:
+def _handoff_active(session: Dict[str, Any], now: Optional[datetime] = None) -> bool:
     if not isinstance(session, dict):
         return False
     if not bool(session.get("handoff_active")):
         return False
     until = _parse_iso(session.get("handoff_until")) if isinstance(session.get("handoff_until"), str) else None
-    if until and _utcnow() <= until:
+    if until and (now or _utcnow()) <= until:
         return True
     session["handoff_active"] = False
     session["handoff_until"] = None
     return False
 
 
+def _recent_escalation(session: Dict[str, Any], now: datetime) -> bool:
+    if ESCALATION_DEDUPE_SECONDS <= 0:
+        return False
+    at = _parse_iso(session.get("escalated_at"))
+    return at is not None and (now - at).total_seconds() < ESCALATION_DEDUPE_SECONDS
+
+
 def _short_ref(ticket_id: Optional[str]) -> Optional[str]:
     if not ticket_id or not isinstance(ticket_id, str):
         return None
@@ -103,25 +171,71 @@ def _short_ref(ticket_id: Optional[str]) -> Optional[str]:
     return head[:8] if head else None
 
 
+# dispatch_ticket result shapes, in lookup order (first truthy value wins)
+_TICKET_ID_PATHS = (("ticket_id",), ("result", "ticket_id"), ("result", "id"))
+
+
 def _extract_ticket_id(result: Any) -> Optional[str]:
-    if not isinstance(result, dict):
-        return None
-    if result.get("ticket_id"):
-        return str(result.get("ticket_id"))
-    inner = result.get("result")
-    if isinstance(inner, dict):
-        tid = inner.get("ticket_id") or inner.get("id")
-        return str(tid) if tid else None
+    for path in _TICKET_ID_PATHS:
+        v = result
+        for key in path:
+            v = v.get(key) if isinstance(v, dict) else None
+        if v:
+            return str(v)
     return None
 
 
 def _wants_agent(text: str) -> bool:
-    t = (text or "").strip().lower()
+    # Callers pass _normalize_input() output (already stripped and space-collapsed)
+    t = (text or "").lower()
     if t == "99":
         return True
     if t == "9":  # keep 9 NOT reception
         return False
-    return any(k in t for k in _AGENT_KEYS)
+    return _AGENT_RE.search(t) is not None
+
+
+# Short messages ("hi", "مرحبا", "1", emoji) repeat a lot across users; memoize their detection.
+_DETECT_CACHE_MAX_LEN = 64
+
+
+# Language/tone engines are imported on first use, not at module import:
+# ASCII-only traffic never reaches the detector (see _resolve_language_for_turn).
+_detect_language_fn = None
+
+
+def _detect_language(text: str) -> str:
+    global _detect_language_fn
+    if _detect_language_fn is None:
+        from language.language_detector import detect_language
+        _detect_language_fn = detect_language
+    return (_detect_language_fn(text) or "en").strip().lower()
+
+
+@lru_cache(maxsize=10_000)
+def _detect_language_short(text: str) -> str:
+    return _detect_language(text)
+
+
+def _detect_language_cached(text: str) -> str:
+    t = text or ""
+    if len(t) <= _DETECT_CACHE_MAX_LEN:
+        return _detect_language_short(t)
+    return _detect_language(t)
+
+
+# Tone depends only on (region, business context); both are tiny, stable domains.
+@lru_cache(maxsize=64)
+def _tone_cached(region: Optional[str], business_context: str) -> str:
+    from language.arabic_tone_engine import select_arabic_tone
+    return select_arabic_tone(region, business_context)
+
+
+def _resolve_arabic_tone(language: str, session: Dict[str, Any]) -> Optional[str]:
+    if language != "ar":
+        return None
+    region = session.get("user_region") or session.get("region")
+    return _tone_cached(region if isinstance(region, str) else None, "support")
 
 
 def _resolve_language_for_turn(message_text: str, session: Dict[str, Any]) -> str:
@@ -133,15 +247,107 @@ def _resolve_language_for_turn(message_text: str, session: Dict[str, Any]) -> st
     if _looks_english(message_text):
         return "en"
 
-    raw = (message_text or "").strip()
-    if raw.isdigit():
+    # Pure ASCII (digits, punctuation, ":)") can't be Arabic; skip the detector
+    if (message_text or "").isascii():
         return "en"
 
-    detected = (detect_language(message_text) or "en").strip().lower()
+    detected = _detect_language_cached(message_text)
     return "ar" if detected.startswith("ar") else "en"
 
 
-async def _escalate_to_human(
+# (lang, tone, direction) has a handful of values: build each scaffold once
+@lru_cache(maxsize=32)
+def _agent_constraints_template(lang: str, arabic_tone: Optional[str], text_direction: str) -> Dict[str, Any]:
+    return {
+        "reply_language": lang,
+        "language_lock": True,
+        "arabic_tone": arabic_tone if lang == "ar" else None,
+        "rtl_required": text_direction == "rtl",
+    }
+
+
+def _build_agent_constraints(lang: str, arabic_tone: Optional[str], text_direction: str) -> Dict[str, Any]:
+    # Copy: the payload outlives this turn on the dispatch pool; the template is shared
+    return _agent_constraints_template(lang, arabic_tone, text_direction).copy()
+
+
+def _audit_escalation(
+    user_id: str,
+    rule: str,
+    priority: str,
+    conversation_version: int,
+    lang: Optional[str] = None,
+    vendor_status: Optional[str] = None,
+) -> None:
+    # Queued; the audit bus writer keeps file I/O off the reply path
+    audit_bus.submit(
+        escalation_event(
+            user_id=user_id,
+            rule=rule,
+            priority=priority,
+            conversation_version=conversation_version,
+            lang=lang,
+            vendor_status=vendor_status,
+        )
+    )
+
+
+def _dispatch_and_audit(
+    payload: Dict[str, Any],
+    *,
+    user_id: str,
+    decision_rule: str,
+    fallback_priority: str,
+    conversation_version: int,
+    lang: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Runs on _dispatch_pool: routing + vendor dispatch + audit, all off the event loop.
+    Completes (and audits) even when the reply stopped waiting for it. Never raises.
+    """
+    priority = fallback_priority
+    try:
+        # Escalation-only modules (vendor adapters, health monitor) load on first handoff
+        from escalation_router import route_escalation
+        from vendor_orchestrator import dispatch_ticket
+
+        routing = route_escalation(payload)
+        priority = str(routing.get("priority") or fallback_priority)
+        result = dispatch_ticket(payload, routing) or {}
+    except Exception as e:
+        # Worker thread: this write never blocks the event loop
+        print(f"[escalation] dispatch error user={user_id} version={conversation_version}:", repr(e))
+        result = {}
+    vendor_status = str(result.get("status") or "error") if isinstance(result, dict) else "error"
+    _audit_escalation(user_id, decision_rule, priority, conversation_version, lang, vendor_status)
+    return result
+
+
+async def _record_late_ticket(waiter: "asyncio.Future[Any]", tenant_id: str, user_id: str) -> None:
+    """
+    Stores a ticket ref that arrived after the reply stopped waiting for it, so the
+    next handoff reply / dashboard read shows it. Runs after the turn releases the lock.
+    """
+    try:
+        ticket_id = _extract_ticket_id(await waiter)
+        if not ticket_id:
+            return
+        from database import AsyncSessionLocal
+
+        async with AsyncExitStack() as stack:
+            await _enter_session_locks(stack, tenant_id, user_id)
+            async with AsyncSessionLocal() as db:
+                session = await get_session(db, user_id=user_id, tenant_id=tenant_id)
+                # Only while that handoff is still open (the user may have gone back to the menu)
+                if not session or not session.get("handoff_active"):
+                    return
+                session["last_ticket_id"] = ticket_id
+                await upsert_session(db, user_id=user_id, session=session, tenant_id=tenant_id)
+    except Exception as e:
+        print(f"[escalation] late ticket ref error user={user_id}:", repr(e))
+
+
+async def _open_ticket(
     *,
     tenant_id: str,
     user_id: str,
@@ -152,8 +358,16 @@ async def _escalate_to_human(
     kpi_signals: List[str],
     decision_rule: str,
     decision_reason: str,
-    urgent: bool = False,
-) -> Tuple[Optional[str], Dict[str, Any]]:
+    urgent: bool,
+    now: datetime,
+) -> Tuple[Optional[str], bool]:
+    """
+    Dispatches a ticket; returns (ticket_id, late_ref_pending). ticket_id is None when
+    dispatch failed or is still running; in the latter case a background task records it.
+    """
+    from handoff_builder import build_handoff_payload
+
+    conversation_version = int(session.get("conversation_version") or 0)
     payload = build_handoff_payload(
         user_id=user_id,
         current_state=session.get("state"),
@@ -162,30 +376,93 @@ async def _escalate_to_human(
         decision_rule=decision_rule,
         decision_reason=decision_reason,
         kpi_signals=kpi_signals,
+        generated_at=now.isoformat().replace("+00:00", "Z"),
+        meta={
+            "tenant_id": tenant_id,
+            "language": language,
+            "text_direction": text_direction,
+            "urgent": bool(urgent),
+        },
+        agent_constraints=_build_agent_constraints(language, arabic_tone, text_direction),
+        conversation_version=conversation_version,
     )
-    payload.setdefault("meta", {})
-    payload["meta"]["tenant_id"] = tenant_id
-    payload["meta"]["language"] = language
-    payload["meta"]["text_direction"] = text_direction
-    payload["meta"]["urgent"] = bool(urgent)
 
     ticket_id = None
+    pending = False
+    fallback_priority = "urgent" if urgent else "normal"
     try:
-        routing = route_escalation(payload)
-        result = await anyio.to_thread.run_sync(dispatch_ticket, payload, routing)
-        ticket_id = _extract_ticket_id(result)
-    except Exception:
+        fut = _dispatch_pool.submit(
+            _dispatch_and_audit,
+            payload,
+            user_id=user_id,
+            decision_rule=decision_rule,
+            fallback_priority=fallback_priority,
+            conversation_version=conversation_version,
+            lang=language,
+        )
+        # Don't cancel on timeout: the ticket is still created in the background
+        waiter = asyncio.wrap_future(fut)
+        done, _ = await asyncio.wait({waiter}, timeout=ESCALATION_DISPATCH_WAIT_SECONDS)
+        if done:
+            ticket_id = _extract_ticket_id(waiter.result())
+        else:
+            task = asyncio.create_task(_record_late_ticket(waiter, tenant_id, user_id))
+            _late_ticket_tasks.add(task)
+            task.add_done_callback(_late_ticket_tasks.discard)
+            pending = True
+    except Exception as e:
+        print(f"[escalation] submit error user={user_id} version={conversation_version}:", repr(e))
         ticket_id = None
+        _audit_escalation(user_id, decision_rule, fallback_priority, conversation_version, language, "error")
+
+    return ticket_id, pending
+
+
+async def _escalate_to_human(
+    *,
+    tenant_id: str,
+    user_id: str,
+    session: Dict[str, Any],
+    language: str,
+    text_direction: str,
+    arabic_tone: Optional[str],
+    kpi_signals: List[str],
+    decision_rule: str,
+    decision_reason: str,
+    urgent: bool = False,
+    now: Optional[datetime] = None,
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    now = now or _utcnow()
+
+    # A handoff opened moments ago (user left it with 0 and asked again): reuse that
+    # ticket instead of dispatching a duplicate to the vendor
+    if _recent_escalation(session, now) and session.get("last_ticket_id"):
+        ticket_id = session.get("last_ticket_id")
+    else:
+        ticket_id, pending = await _open_ticket(
+            tenant_id=tenant_id,
+            user_id=user_id,
+            session=session,
+            language=language,
+            text_direction=text_direction,
+            arabic_tone=arabic_tone,
+            kpi_signals=kpi_signals,
+            decision_rule=decision_rule,
+            decision_reason=decision_reason,
+            urgent=urgent,
+            now=now,
+        )
+        # A failed dispatch must not open the dedupe window: the next request retries it
+        session["escalated_at"] = now.isoformat() if (ticket_id or pending) else None
+        session["last_ticket_id"] = ticket_id  # never show an older ticket's ref for this one
 
     session["handoff_active"] = True
-    session["handoff_until"] = (_utcnow() + timedelta(minutes=HANDOFF_STICKY_MINUTES)).isoformat()
+    session["handoff_until"] = (now + timedelta(minutes=HANDOFF_STICKY_MINUTES)).isoformat()
     session["state"] = "ESCALATION"
     session["last_step"] = "ESCALATION"
     session["escalation_flag"] = True
     if urgent:
         session["urgent_flag"] = True
-    if ticket_id:
-        session["last_ticket_id"] = ticket_id
 
     return ticket_id, {"ticket_id": ticket_id, "urgent": urgent}
 
@@ -199,45 +476,47 @@ async def handle_message(
     kpi_signals=None,
 ) -> Tuple[str, Dict[str, Any]]:
     tenant = _norm_tenant(tenant_id)
+    async with AsyncExitStack() as stack:
+        await _enter_session_locks(stack, tenant, user_id)
+        return await _handle_message_locked(
+            db=db,
+            user_id=user_id,
+            message_text=message_text,
+            tenant=tenant,
+            kpi_signals=kpi_signals,
+        )
+
+
+async def _handle_message_locked(
+    *,
+    db: AsyncSession,
+    user_id: str,
+    message_text: str,
+    tenant: str,
+    kpi_signals=None,
+) -> Tuple[str, Dict[str, Any]]:
     kpi_signals = list(kpi_signals or [])
+    now = _utcnow()  # one clock read per turn
 
     cleaned = _normalize_input(message_text)
-    raw = cleaned
 
     session = await get_session(db, user_id=user_id, tenant_id=tenant)
     is_new_session = not isinstance(session, dict) or not session
 
     if is_new_session:
-        session = {
-            "user_id": user_id,
-            "status": "ACTIVE",
-            "state": "LANG_SELECT",
-            "last_step": "LANG_SELECT",
-            "language": "en",
-            "language_locked": False,
-            "text_direction": "ltr",
-            "has_greeted": False,
-            "conversation_version": 6,
-            "escalation_flag": False,
-            "urgent_flag": False,
-            "handoff_active": False,
-            "handoff_until": None,
-            "last_ticket_id": None,
-            "last_intent": None,
-        }
-        await upsert_session(db, user_id=user_id, session=session, tenant_id=tenant)
+        session = {**_NEW_SESSION_TEMPLATE, "user_id": user_id, "is_vip": is_vip_user(user_id)}
+        # Not written yet: every path below ends with exactly one upsert for this turn
 
     session["last_user_message"] = cleaned
     session["last_intent"] = session.get("intent") or session.get("last_intent")
 
     # Sticky handoff silence
-    if _handoff_active(session):
-        if raw == "0":
+    if _handoff_active(session, now=now):
+        if cleaned == "0":
             session["handoff_active"] = False
             session["handoff_until"] = None
             session["state"] = "MAIN_MENU"
             session["last_step"] = "MAIN_MENU"
-            await upsert_session(db, user_id=user_id, session=session, tenant_id=tenant)
 
             engine_out = run_engine(
                 session=session,
@@ -265,35 +544,26 @@ async def handle_message(
     language = _resolve_language_for_turn(cleaned, session)
     session["language"] = language
     session["text_direction"] = "rtl" if language == "ar" else "ltr"
-    arabic_tone = select_arabic_tone(cleaned) if language == "ar" else None
 
     # Agent override only
-    if raw == "99" or _wants_agent(cleaned):
+    if cleaned == "99" or _wants_agent(cleaned):
         ticket_id, extra = await _escalate_to_human(
             tenant_id=tenant,
             user_id=user_id,
             session=session,
             language=language,
             text_direction=session.get("text_direction", "ltr"),
-            arabic_tone=arabic_tone,
+            # Tone only feeds the agent constraints; the engine's replies don't use it
+            arabic_tone=_resolve_arabic_tone(language, session),
             kpi_signals=kpi_signals,
             decision_rule="controller_agent_override",
             decision_reason="User requested reception",
             urgent=False,
+            now=now,
         )
         short_ref = _short_ref(ticket_id)
-        if language == "ar":
-            reply = (
-                f"تم تحويلكم إلى موظف الاستقبال ✅ رقم الطلب: #{short_ref}\nللعودة للقائمة اكتب 0"
-                if short_ref else
-                "تم تحويلكم إلى موظف الاستقبال ✅\nللعودة للقائمة اكتب 0"
-            )
-        else:
-            reply = (
-                f"Connecting you to Reception ✅ Ref: #{short_ref}\nReply 0 for the menu"
-                if short_ref else
-                "Connecting you to Reception ✅\nReply 0 for the menu"
-            )
+        is_ar = language == "ar"
+        reply = _HANDOFF_REPLIES[(is_ar, True)].format(ref=short_ref) if short_ref else _HANDOFF_REPLIES[(is_ar, False)]
 
         await upsert_session(db, user_id=user_id, session=session, tenant_id=tenant)
         meta = {"tenant_id": tenant, "state": session.get("state"), "handoff_active": True, "actions": []}
@@ -307,7 +577,6 @@ async def handle_message(
         session=session,
         user_message=cleaned,
         language=language,
-        arabic_tone=arabic_tone,
         kpi_signals=kpi_signals,
     )
 